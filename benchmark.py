@@ -0,0 +1,375 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+import itertools
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# Offline load test: drives the real ConversationHandler graph from bot.py
+# with synthetic updates against local stand-ins for the Heroku Platform API
+# and the Telegram Bot API. Usage: python3 benchmark.py --users 20 --iterations 10
+
+BENCH_TOKEN = "123456:benchmark"
+BENCH_PASSWORD = "benchmark"
+
+
+class FakeHeroku:
+    # Just enough of the Platform API for the bot's flows, with ETags,
+    # Range paging, artificial latency and random 429 answers.
+    def __init__(self, apps, config_size, latency, rate_limit_ratio):
+        self.apps = {}
+        for index in range(apps):
+            app_id = str(uuid.UUID(int=index + 1))
+            self.apps[app_id] = {"id": app_id, "name": f"bench-app-{index:04d}", "updated_at": "2024-01-01T00:00:00Z"}
+        self.config = {app_id: {f"VAR_{key:03d}": f"value-{key}" for key in range(config_size)} for app_id in self.apps}
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def find(self, key):
+        if key in self.apps:
+            return self.apps[key]
+        return next((app for app in self.apps.values() if app["name"] == key), None)
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, code, body=None, headers=None):
+                data = b"" if body is None else json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("RateLimit-Remaining", "4000")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def reply_etagged(self, body, code=200, headers=None):
+                etag = '"%s"' % hashlib.md5(json.dumps(body, sort_keys=True).encode()).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    return self.reply(304, None, {"ETag": etag})
+                return self.reply(code, body, {"ETag": etag, **(headers or {})})
+
+            def route(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                path = urlsplit(self.path).path.strip("/").split("/")
+                endpoint = "/".join("{id}" if index and path[index - 1] == "apps" else part for index, part in enumerate(path))
+                with fake.lock:
+                    fake.calls[f"{method} /{endpoint}"] += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake.rate_limit_ratio and random.random() < fake.rate_limit_ratio:
+                    return self.reply(429, {"id": "rate_limit", "message": "Your account reached the API rate limit"}, {"Retry-After": "0"})
+                if path == ["account"] or path == ["account", "rate-limits"]:
+                    return self.reply(200, {"id": "bench", "email": "bench@example.com", "remaining": 4000})
+                if path == ["apps"]:
+                    return self.list_apps()
+                app = fake.find(path[1]) if len(path) > 1 and path[0] == "apps" else None
+                if app is None:
+                    return self.reply(404, {"id": "not_found", "message": "Not found"})
+                if len(path) == 2:
+                    return self.reply(200, app)
+                if path[2] == "config-vars":
+                    if method == "PATCH":
+                        with fake.lock:
+                            for key, value in body.items():
+                                if value is None:
+                                    fake.config[app["id"]].pop(key, None)
+                                else:
+                                    fake.config[app["id"]][key] = value
+                    return self.reply_etagged(dict(fake.config[app["id"]]))
+                if path[2] == "dynos" and method == "DELETE":
+                    return self.reply(202, {})
+                if path[2] == "dynos":
+                    return self.reply_etagged([{"id": "d1", "name": "web.1", "type": "web", "state": "up", "size": "basic", "command": "python3 bot.py"}])
+                return self.reply(404, {"id": "not_found", "message": "Not found"})
+
+            def list_apps(self):
+                requested = self.headers.get("Range", "")
+                apps = sorted(fake.apps.values(), key=lambda app: app["name"])
+                page_size = int(requested.split("max=")[1].split(";")[0]) if "max=" in requested else 200
+                if requested.startswith("]"):
+                    after = requested[1:].split("..")[0]
+                    apps = [app for app in apps if app["name"] > after]
+                page = apps[:page_size]
+                if len(apps) > page_size:
+                    return self.reply_etagged(page, 206, {"Next-Range": f"]{page[-1]['name']}..; max={page_size};"})
+                return self.reply_etagged(page)
+
+            def do_GET(self):
+                self.route("GET")
+
+            def do_POST(self):
+                self.route("POST")
+
+            def do_PATCH(self):
+                self.route("PATCH")
+
+            def do_DELETE(self):
+                self.route("DELETE")
+
+        return Handler
+
+
+class FakeTelegram:
+    # Accepts every Bot API method and answers with a plausible result.
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.message_ids = itertools.count(10_000)
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                method = self.path.rsplit("/", 1)[-1]
+                params = {}
+                if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+                    params = {key: values[0] for key, values in parse_qs(raw.decode()).items()}
+                with fake.lock:
+                    fake.calls[method] += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                self.respond(method, params)
+
+            def respond(self, method, params):
+                chat_id = int(params.get("chat_id", 1))
+                if method == "getMe":
+                    result = {"id": 123456, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+                elif method in ("sendMessage", "editMessageText", "sendDocument", "editMessageReplyMarkup"):
+                    message_id = int(params.get("message_id") or next(fake.message_ids))
+                    result = {"message_id": message_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")}
+                else:
+                    result = True
+                data = json.dumps({"ok": True, "result": result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class UpdateFactory:
+    def __init__(self):
+        self.ids = itertools.count(1)
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    def message(self, user_id, text):
+        update = {
+            "update_id": next(self.ids),
+            "message": {
+                "message_id": next(self.ids), "date": int(time.time()), "text": text,
+                "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id),
+            },
+        }
+        if text.startswith("/"):
+            update["message"]["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return update
+
+    def callback(self, user_id, data):
+        return {
+            "update_id": next(self.ids),
+            "callback_query": {
+                "id": str(next(self.ids)), "chat_instance": str(user_id), "data": data, "from": self._user(user_id),
+                "message": {"message_id": 1, "date": int(time.time()), "text": "menu", "chat": {"id": user_id, "type": "private"}},
+            },
+        }
+
+
+def build_flows(updates, app_ids, config_size):
+    # Each flow is a list of (step name, update factory) pairs that one
+    # virtual user walks through in order.
+    def browse(user_id, iteration):
+        app_id = app_ids[(user_id + iteration) % len(app_ids)]
+        return [
+            ("main_menu", updates.callback(user_id, "main_menu")),
+            ("app_picker", updates.callback(user_id, "manage_envs")),
+            ("app_picker_page", updates.callback(user_id, "apps_page_1" if len(app_ids) > 10 else "apps_page_0")),
+            ("env_page", updates.callback(user_id, f"app_{app_id}")),
+            ("env_page_next", updates.callback(user_id, "env_page_1" if config_size > 10 else "env_page_0")),
+        ]
+
+    def update_env(user_id, iteration):
+        key = f"VAR_{iteration % max(config_size, 1):03d}"
+        return browse(user_id, iteration) + [
+            ("env_edit", updates.callback(user_id, f"update_env_{key}")),
+            ("env_stage", updates.message(user_id, f"bench-{user_id}-{iteration}")),
+            ("env_review", updates.callback(user_id, "review_env_changes")),
+            ("env_commit", updates.callback(user_id, "commit_env_changes")),
+        ]
+
+    return {"browse": browse, "update_env": update_env}
+
+
+def percentile(samples, point):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, -(-point * len(ordered) // 100) - 1))]
+
+
+async def run_benchmark(args):
+    heroku = FakeHeroku(args.apps, args.config_size, args.heroku_latency / 1000, args.rate_limit_ratio)
+    telegram = FakeTelegram(args.telegram_latency / 1000)
+    heroku_server = serve(heroku.handler())
+    telegram_server = serve(telegram.handler())
+
+    os.environ["HEROKU_API_URL"] = f"http://127.0.0.1:{heroku_server.server_port}"
+    os.environ["TELEGRAM_API_BASE_URL"] = f"http://127.0.0.1:{telegram_server.server_port}"
+    os.environ["PERSISTENCE_PATH"] = ""
+    os.environ.setdefault("UPDATE_CONCURRENCY", str(args.concurrency))
+    os.environ.setdefault("TELEGRAM_CHAT_RATE", str(args.chat_rate))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import bot
+
+    bot.TELEGRAM_BOT_TOKEN = BENCH_TOKEN
+    bot.BOT_PASSWORD = BENCH_PASSWORD
+    bot.HEROKU_AUTH_TOKEN = "benchmark"
+    bot.heroku_connections = bot.HerokuConnectionManager("benchmark", bot.HEROKU_POOL_SIZE, bot.HEROKU_HEALTHCHECK_INTERVAL)
+    application = bot.build_application()
+    await application.initialize()
+
+    from telegram import Update
+
+    async def dispatch(raw):
+        update = Update.de_json(raw, application.bot)
+        # Same path the application takes for queued updates, minus the queue.
+        await application.update_processor.process_update(update, application.process_update(update))
+
+    updates = UpdateFactory()
+    flows = build_flows(updates, sorted(heroku.apps), args.config_size)
+    users = [1000 + index for index in range(args.users)]
+    for user_id in users:
+        await dispatch(updates.message(user_id, "/start"))
+        await dispatch(updates.message(user_id, BENCH_PASSWORD))
+    heroku.calls.clear()
+    telegram.calls.clear()
+
+    latencies = {}
+
+    async def virtual_user(user_id):
+        for iteration in range(args.iterations):
+            for name, raw in flows[args.flow](user_id, iteration):
+                started = time.perf_counter()
+                await dispatch(raw)
+                latencies.setdefault(name, []).append(time.perf_counter() - started)
+                if args.think_time:
+                    await asyncio.sleep(args.think_time / 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(user_id) for user_id in users))
+    elapsed = time.perf_counter() - started
+
+    await application.shutdown()
+    await bot.shutdown_gateway(application)
+    heroku_server.shutdown()
+    telegram_server.shutdown()
+
+    steps = sum(len(samples) for samples in latencies.values())
+    return {
+        "flow": args.flow,
+        "users": args.users,
+        "iterations": args.iterations,
+        "elapsed_s": round(elapsed, 3),
+        "steps": steps,
+        "steps_per_s": round(steps / elapsed, 1) if elapsed else 0.0,
+        "flows_per_s": round(args.users * args.iterations / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            name: {
+                "count": len(samples),
+                "p50": round(percentile(samples, 50) * 1000, 2),
+                "p95": round(percentile(samples, 95) * 1000, 2),
+                "p99": round(percentile(samples, 99) * 1000, 2),
+            }
+            for name, samples in latencies.items()
+        },
+        "heroku_calls": dict(heroku.calls.most_common()),
+        "telegram_calls": dict(telegram.calls.most_common()),
+    }
+
+
+def print_report(report):
+    print(f"Flow {report['flow']}: {report['users']} users x {report['iterations']} iterations in {report['elapsed_s']}s")
+    print(f"Throughput: {report['steps_per_s']} updates/s, {report['flows_per_s']} flows/s")
+    print()
+    print(f"{'step':<18}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in report["latency_ms"].items():
+        print(f"{name:<18}{stats['count']:>8}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}")
+    print()
+    print(f"Heroku API calls: {sum(report['heroku_calls'].values())}")
+    for endpoint, count in report["heroku_calls"].items():
+        print(f"  {endpoint:<40}{count:>8}")
+    print(f"Telegram API calls: {sum(report['telegram_calls'].values())}")
+    for method, count in report["telegram_calls"].items():
+        print(f"  {method:<40}{count:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot against local fake Heroku and Telegram APIs.")
+    parser.add_argument("--flow", choices=("browse", "update_env"), default="update_env")
+    parser.add_argument("--users", type=int, default=10, help="virtual users running the flow concurrently")
+    parser.add_argument("--iterations", type=int, default=5, help="times each user runs the flow")
+    parser.add_argument("--apps", type=int, default=50, help="apps on the fake Heroku account")
+    parser.add_argument("--config-size", type=int, default=30, help="config vars per app")
+    parser.add_argument("--heroku-latency", type=float, default=20, help="added latency per Heroku request, in ms")
+    parser.add_argument("--telegram-latency", type=float, default=20, help="added latency per Telegram request, in ms")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="share of Heroku requests answered with 429")
+    parser.add_argument("--think-time", type=float, default=0, help="pause between a user's steps, in ms")
+    parser.add_argument("--concurrency", type=int, default=16, help="UPDATE_CONCURRENCY for the run")
+    parser.add_argument(
+        "--chat-rate", type=float, default=0,
+        help="TELEGRAM_CHAT_RATE for the run; 0 turns per-chat pacing off, which virtual users without think time would hit",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    report = asyncio.run(run_benchmark(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
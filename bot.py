@@ -1,17 +1,51 @@
+import io
 import os
+import re
+import random
+import gzip
+import json
+import hmac
+import time
+import socket
+import hashlib
+import bisect
+import pickle
+import sqlite3
+import asyncio
 import logging
-import heroku3
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import functools
+import threading
+import collections
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+from aiolimiter import AsyncLimiter
+from heroku3.api import Heroku, RateLimitExceeded
+from heroku3.models.app import App
+import requests
+from requests.adapters import HTTPAdapter
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from telegram.helpers import escape_markdown
+from telegram.request import BaseRequest, HTTPXRequest
 from telegram.ext import (
+    AIORateLimiter,
     Application,
+    BasePersistence,
+    BaseUpdateProcessor,
+    PersistenceInput,
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
     filters,
     ContextTypes,
     ConversationHandler,
+    ExtBot,
 )
 import urllib3
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPSConnectionPool
+from urllib3.util.retry import Retry
+from urllib.parse import urlsplit
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 logging.basicConfig(
@@ -23,6 +57,70 @@ TELEGRAM_BOT_TOKEN = os.environ.get("7344124882:AAG1Y8tpX3JwzVmgyP_0jWzW_Giagzf4
 HEROKU_AUTH_TOKEN = os.environ.get("HRKU-AA05n85j1FbxCI9J8_R84BnPrqWcs1QKeS3MxKY2ndfw_____wCCykuNVatQ")
 BOT_PASSWORD = os.environ.get("Rulf336")
 ENVS_PER_PAGE = 10
+APPS_PER_PAGE = 10
+HEROKU_MAX_WORKERS = int(os.environ.get("HEROKU_MAX_WORKERS", "8"))
+HEROKU_CALL_TIMEOUT = float(os.environ.get("HEROKU_CALL_TIMEOUT", "30"))
+HEROKU_POOL_SIZE = int(os.environ.get("HEROKU_POOL_SIZE", str(HEROKU_MAX_WORKERS)))
+HEROKU_HEALTHCHECK_INTERVAL = float(os.environ.get("HEROKU_HEALTHCHECK_INTERVAL", "300"))
+HEROKU_RATE_LIMIT = int(os.environ.get("HEROKU_RATE_LIMIT", "4500"))
+HEROKU_BACKGROUND_RESERVE = int(os.environ.get("HEROKU_BACKGROUND_RESERVE", "450"))
+HEROKU_RATE_LIMIT_RETRIES = int(os.environ.get("HEROKU_RATE_LIMIT_RETRIES", "3"))
+HEROKU_BACKGROUND_WORKERS = int(os.environ.get("HEROKU_BACKGROUND_WORKERS", str(max(1, HEROKU_MAX_WORKERS // 4))))
+APP_CATALOG_TTL = float(os.environ.get("APP_CATALOG_TTL", "300"))
+APP_CATALOG_PAGE_SIZE = int(os.environ.get("APP_CATALOG_PAGE_SIZE", "200"))
+ENV_CACHE_TTL = float(os.environ.get("ENV_CACHE_TTL", "60"))
+DYNO_STATUS_TTL = float(os.environ.get("DYNO_STATUS_TTL", "10"))
+DYNO_RESTART_STAGGER = float(os.environ.get("DYNO_RESTART_STAGGER", "15"))
+DYNO_RESTART_TIMEOUT = float(os.environ.get("DYNO_RESTART_TIMEOUT", "120"))
+DYNO_RESTART_POLL_INTERVAL = 5
+DYNO_PANEL_MAX_DYNOS = 20
+DYNO_SIZES = ("eco", "basic", "standard-1X", "standard-2X", "performance-M", "performance-L")
+DYNO_STATE_ICONS = {"up": "✅", "starting": "🟡", "restarting": "🟡", "idle": "💤", "crashed": "❌", "down": "⛔"}
+WATCH_APPS = [name.strip() for name in os.environ.get("WATCH_APPS", "").split(",") if name.strip()]
+WATCH_INTERVAL = float(os.environ.get("WATCH_INTERVAL", "60"))
+WATCH_RELEASES_PER_POLL = 20
+WATCH_CONCURRENCY = 4
+WATCH_BUDGET_SHARE = float(os.environ.get("WATCH_BUDGET_SHARE", "0.25"))
+WATCH_REQUESTS_PER_CHECK = 3
+LOG_FLUSH_INTERVAL = float(os.environ.get("LOG_FLUSH_INTERVAL", "2"))
+LOG_FLUSH_SIZE = int(os.environ.get("LOG_FLUSH_SIZE", "3500"))
+LOG_IDLE_TIMEOUT = float(os.environ.get("LOG_IDLE_TIMEOUT", "120"))
+LOG_FOLLOW_MAX_DURATION = float(os.environ.get("LOG_FOLLOW_MAX_DURATION", "900"))
+LOG_MAX_FOLLOWERS = int(os.environ.get("LOG_MAX_FOLLOWERS", "5"))
+LOG_QUEUE_SIZE = 1000
+LOG_LINE_CHOICES = (100, 500, 1500)
+LOG_DOCUMENT_THRESHOLD = int(os.environ.get("LOG_DOCUMENT_THRESHOLD", "12000"))
+LOG_GZIP = os.environ.get("LOG_GZIP", "false").lower() in ("1", "true", "yes")
+TELEGRAM_MESSAGE_LIMIT = 4096
+ENV_IMPORT_MAX_BYTES = int(os.environ.get("ENV_IMPORT_MAX_BYTES", str(1024 * 1024)))
+ENV_KEY_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+FANOUT_CONCURRENCY = int(os.environ.get("FANOUT_CONCURRENCY", "5"))
+FANOUT_MAX_RETRIES = int(os.environ.get("FANOUT_MAX_RETRIES", "3"))
+FANOUT_PROGRESS_INTERVAL = float(os.environ.get("FANOUT_PROGRESS_INTERVAL", "3"))
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", "16"))
+UPDATE_MAX_PENDING = 256
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+METRICS_READ_TIMEOUT = 10
+ADMIN_USER_IDS = {int(user_id) for user_id in os.environ.get("ADMIN_USER_IDS", "").replace(" ", "").split(",") if user_id}
+PERSISTENCE_PATH = os.environ.get("PERSISTENCE_PATH", "bot_state.sqlite3")
+PERSISTENCE_INTERVAL = float(os.environ.get("PERSISTENCE_INTERVAL", "5"))
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("PORT", "8443"))
+WEBHOOK_PATH = "/" + os.environ.get("WEBHOOK_PATH", "telegram").strip("/")
+WEBHOOK_SECRET_TOKEN = os.environ.get("WEBHOOK_SECRET_TOKEN") or (
+    hashlib.sha256(TELEGRAM_BOT_TOKEN.encode()).hexdigest() if TELEGRAM_BOT_TOKEN else ""
+)
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", "40"))
+TELEGRAM_API_BASE_URL = os.environ.get("TELEGRAM_API_BASE_URL", "").rstrip("/")
+HEROKU_API_URL = os.environ.get("HEROKU_API_URL", "").rstrip("/")
+TELEGRAM_MAX_RETRIES = int(os.environ.get("TELEGRAM_MAX_RETRIES", "2"))
+RENDERED_MESSAGES_CACHE = 2000
+TELEGRAM_CHAT_RATE = float(os.environ.get("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = int(os.environ.get("TELEGRAM_CHAT_BURST", "5"))
+CHAT_LIMITERS_CACHE = 1000
 
 (
     SELECTING_ACTION,
@@ -31,12 +129,475 @@ ENVS_PER_PAGE = 10
     ENTERING_ENV_KEY_ADD,
     ENTERING_ENV_VALUE_ADD,
     ENTERING_ENV_KEY_DELETE,
-    CONFIRM_ENV_DELETE,
     SELECTING_APP_FOR_LOGS,
     SELECTING_APP_FOR_RESTART,
     AWAITING_NEW_VALUE,
-    CONFIRM_UPDATE,
-) = range(11)
+    REVIEWING_ENV_CHANGES,
+    AWAITING_ENV_FILE,
+    SEARCHING_APPS,
+    SELECTING_LOG_ACTION,
+    FOLLOWING_LOGS,
+    SELECTING_APPS_FOR_BULK,
+    SELECTING_BULK_ACTION,
+    ENTERING_BULK_ENV_KEY,
+    ENTERING_BULK_ENV_VALUE,
+    CONFIRM_BULK_ACTION,
+    MANAGING_DYNOS,
+    SCALING_DYNOS,
+    CONFIRM_DYNO_ACTION,
+) = range(22)
+
+
+class Histogram:
+    # Cumulative-bucket latency histogram in seconds. Percentiles are
+    # interpolated inside the bucket they fall into, like histogram_quantile.
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def quantile(self, q):
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def percentiles(self, points=(50, 95, 99)):
+        return {point: round(self.quantile(point / 100) * 1000, 1) for point in points}
+
+
+class MetricsRegistry:
+    # Histograms and counters keyed by name and labels, plus callbacks that
+    # read existing stats() at scrape time so caches pay nothing per lookup.
+    def __init__(self):
+        self._help = {}
+        self._histograms = {}
+        self._counters = {}
+        self._callbacks = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    @staticmethod
+    def _key(labels):
+        # Label values are stored as strings so a family that mixes, say, HTTP
+        # status codes and exception names still sorts when rendered.
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def histogram(self, name, **labels):
+        family = self._histograms.setdefault(name, {})
+        key = self._key(labels)
+        histogram = family.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = family.setdefault(key, Histogram())
+        return histogram
+
+    def observe(self, name, seconds, **labels):
+        self.histogram(name, **labels).record(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            family = self._counters.setdefault(name, {})
+            family[key] = family.get(key, 0) + amount
+
+    def register_callback(self, name, kind, text, func):
+        # func returns [(labels dict, value), ...] when the metrics are read.
+        self.describe(name, kind, text)
+        self._callbacks[name] = func
+
+    def slowest(self, name, limit=5):
+        family = self._histograms.get(name, {})
+        ranked = sorted(family.items(), key=lambda item: item[1].quantile(0.95), reverse=True)
+        return [(dict(labels), histogram) for labels, histogram in ranked[:limit] if histogram.count]
+
+    def errors(self, name):
+        with self._lock:
+            return {labels: value for labels, value in self._counters.get(name, {}).items()}
+
+    def render(self):
+        lines = []
+
+        def header(name, default_kind):
+            kind, text = self._help.get(name, (default_kind, name))
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def labels_text(labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+        for name, family in sorted(self._histograms.items()):
+            header(name, "histogram")
+            for labels, histogram in sorted(family.items()):
+                with histogram._lock:
+                    counts, total, seconds = list(histogram.counts), histogram.count, histogram.sum
+                cumulative = 0
+                for bound, count in zip((*histogram.buckets, "+Inf"), counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{labels_text(labels, (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{labels_text(labels)} {seconds}")
+                lines.append(f"{name}_count{labels_text(labels)} {total}")
+        with self._lock:
+            counters = {name: dict(family) for name, family in self._counters.items()}
+        for name, family in sorted(counters.items()):
+            header(name, "counter")
+            for labels, value in sorted(family.items()):
+                lines.append(f"{name}{labels_text(labels)} {value}")
+        for name, func in sorted(self._callbacks.items()):
+            header(name, "gauge")
+            try:
+                for labels, value in func():
+                    lines.append(f"{name}{labels_text(tuple(sorted(labels.items())))} {value}")
+            except Exception as e:
+                logger.warning(f"Could not collect metric {name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+metrics.describe("bot_handler_seconds", "histogram", "Time spent in each Telegram update handler.")
+metrics.describe("bot_handler_errors_total", "counter", "Exceptions raised by each Telegram update handler.")
+metrics.describe("bot_update_wait_seconds", "histogram", "Time an update waited for its user's lane and a worker.")
+metrics.describe("bot_update_handling_seconds", "histogram", "Time from the start of processing to the end of an update.")
+metrics.describe("heroku_call_seconds", "histogram", "Duration of heroku3 calls run on the gateway, including retries.")
+metrics.describe("heroku_request_seconds", "histogram", "Duration of single Heroku API HTTP requests by endpoint.")
+metrics.describe("heroku_request_errors_total", "counter", "Heroku API requests that failed, by endpoint and status.")
+metrics.describe("telegram_request_seconds", "histogram", "Duration of Telegram Bot API requests by method.")
+metrics.describe("telegram_request_errors_total", "counter", "Telegram Bot API requests that failed, by method and status.")
+metrics.describe("watcher_alerts_total", "counter", "Alerts raised by the app watcher.")
+
+
+HEROKU_ID_COLLECTIONS = {"apps", "dynos", "formation", "releases", "log-sessions", "addons", "domains", "builds"}
+
+def heroku_endpoint(method, url):
+    segments = urlsplit(url).path.strip("/").split("/")
+    templated = [
+        "{id}" if index and segments[index - 1] in HEROKU_ID_COLLECTIONS else segment
+        for index, segment in enumerate(segments)
+    ]
+    return f"{method.upper()} /{'/'.join(templated)}"
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        heroku_connections.record_handshake(time.perf_counter() - started)
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            **self.poolmanager.pool_classes_by_scheme,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class HerokuRateGovernor:
+    # Token bucket mirroring Heroku's account budget (HEROKU_RATE_LIMIT per hour,
+    # refilled continuously). The estimate is re-seeded from every
+    # RateLimit-Remaining header. Priorities are applied on the event loop by
+    # admit(), before a call takes a gateway thread: background calls leave a
+    # reserve for interactive ones and yield to any interactive call that is
+    # waiting. Inside the thread, acquire() only waits if the bucket is empty.
+    def __init__(self, capacity, background_reserve):
+        self.capacity = capacity
+        self.background_reserve = background_reserve
+        self.refill_rate = capacity / 3600.0
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        self._interactive_waiting = 0
+        self.reported_remaining = None
+        self.retry_after = None
+        self.throttled = 0
+        self.rate_limited = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.refill_rate)
+        self._updated_at = now
+
+    def _try_admit(self, priority):
+        # Takes the token for the call's first request, or returns how long to wait.
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill()
+        floor = 1 if priority == PRIORITY_INTERACTIVE else self.background_reserve + 1
+        if priority != PRIORITY_INTERACTIVE and self._interactive_waiting:
+            return 0.1
+        if self._tokens >= floor:
+            self._tokens -= 1
+            return 0
+        return (floor - self._tokens) / self.refill_rate
+
+    async def admit(self, priority):
+        waited = False
+        try:
+            while True:
+                with self._condition:
+                    delay = self._try_admit(priority)
+                    if delay <= 0:
+                        return
+                    if not waited:
+                        waited = True
+                        self.throttled += 1
+                        if priority == PRIORITY_INTERACTIVE:
+                            self._interactive_waiting += 1
+                # Re-check at least every second so a fresh RateLimit-Remaining is noticed.
+                await asyncio.sleep(min(max(0.05, delay), 1.0))
+        finally:
+            if waited and priority == PRIORITY_INTERACTIVE:
+                with self._condition:
+                    self._interactive_waiting -= 1
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                self._condition.wait(max(0.05, (1 - self._tokens) / self.refill_rate))
+
+    def refund(self):
+        with self._condition:
+            self._tokens = min(self.capacity, self._tokens + 1)
+            self._condition.notify_all()
+
+    def observe(self, remaining):
+        with self._condition:
+            self.reported_remaining = remaining
+            self._tokens = float(min(self.capacity, remaining))
+            self._updated_at = time.monotonic()
+            self._condition.notify_all()
+
+    def penalize(self, retry_after=None):
+        with self._condition:
+            self.rate_limited += 1
+            self.retry_after = retry_after
+            self._tokens = 0.0
+            self._updated_at = time.monotonic()
+
+    def back_off(self, attempt):
+        # Holds every admission until Retry-After, or an exponential backoff, has passed.
+        with self._condition:
+            delay = self.retry_after if self.retry_after is not None else min(60, 2 ** attempt)
+            delay += random.uniform(0, 1)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            return delay
+
+    def stats(self):
+        with self._condition:
+            self._refill()
+            return {
+                "estimated_remaining": int(self._tokens),
+                "reported_remaining": self.reported_remaining,
+                "capacity": self.capacity,
+                "throttled": self.throttled,
+                "rate_limited": self.rate_limited,
+            }
+
+
+heroku_rate_governor = HerokuRateGovernor(HEROKU_RATE_LIMIT, HEROKU_BACKGROUND_RESERVE)
+# Set by the gateway for the call running in this thread: its priority and
+# whether admit() already took the token for its next request.
+request_budget = threading.local()
+
+
+class GovernedSession(requests.Session):
+    def request(self, method, url, *args, **kwargs):
+        endpoint = heroku_endpoint(method, url)
+        if getattr(request_budget, "prepaid", False):
+            request_budget.prepaid = False
+        else:
+            heroku_rate_governor.acquire()
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception as e:
+            metrics.inc("heroku_request_errors_total", endpoint=endpoint, status=type(e).__name__)
+            raise
+        finally:
+            metrics.observe("heroku_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+        if response.status_code >= 400:
+            metrics.inc("heroku_request_errors_total", endpoint=endpoint, status=response.status_code)
+        remaining = response.headers.get("RateLimit-Remaining")
+        if remaining is not None and remaining.isdigit():
+            heroku_rate_governor.observe(int(remaining))
+        if response.status_code == 429:
+            # Retried by HerokuGateway.run, which waits on the event loop rather than in this thread.
+            retry_after = response.headers.get("Retry-After")
+            heroku_rate_governor.penalize(float(retry_after) if retry_after and retry_after.isdigit() else None)
+        return response
+
+
+class HerokuConnectionManager:
+    # One authenticated heroku3 client per process, backed by a keep-alive
+    # session so TLS connections are reused across button presses. _lock only
+    # guards the fields; the key check and the reconnect run outside it, since
+    # the TLS handshakes they cause report back through record_handshake.
+    def __init__(self, api_key, pool_size, healthcheck_interval):
+        self._api_key = api_key
+        self._pool_size = pool_size
+        self._healthcheck_interval = healthcheck_interval
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._conn = None
+        self._checked_at = 0.0
+        self._checking = False
+        self.handshakes = 0
+        self.handshake_seconds = 0.0
+        self.requests = 0
+        self.reconnects = 0
+
+    def _count_request(self, response, *args, **kwargs):
+        self.requests += 1
+
+    def _connect(self):
+        session = GovernedSession()
+        adapter = KeepAliveAdapter(
+            pool_connections=2,
+            pool_maxsize=self._pool_size,
+            max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2),
+        )
+        session.mount("https://", adapter)
+        session.hooks["response"].append(self._count_request)
+        # Same as heroku3.from_key, but the API root can be pointed elsewhere
+        # before the key is verified against it.
+        session.trust_env = False
+        conn = Heroku(session=session)
+        if HEROKU_API_URL:
+            conn._heroku_url = HEROKU_API_URL
+        conn._api_key = self._api_key
+        session.auth = ("", self._api_key)
+        if not verify_api_key(conn):
+            raise RuntimeError("Heroku rejected the API key")
+        return conn
+
+    def _check(self, conn):
+        try:
+            healthy = verify_api_key(conn)
+        except requests.RequestException as e:
+            # Being rate limited says nothing about the key; keep the connection.
+            healthy = is_rate_limited(e)
+            if not healthy:
+                logger.warning(f"Heroku health check failed: {e}")
+        with self._lock:
+            self._checking = False
+            self._checked_at = time.monotonic()
+            if not healthy and self._conn is conn:
+                self._conn = None
+                self.reconnects += 1
+
+    def get(self):
+        with self._lock:
+            conn = self._conn
+            now = time.monotonic()
+            # Only one caller checks an idle connection; the others keep using it meanwhile.
+            check = conn is not None and not self._checking and now - self._checked_at > self._healthcheck_interval
+            if check:
+                self._checking = True
+            elif conn is not None:
+                self._checked_at = now
+        if check:
+            self._check(conn)
+            with self._lock:
+                conn = self._conn
+        if conn is not None:
+            return conn
+        with self._connect_lock:
+            with self._lock:
+                conn = self._conn
+            if conn is None:
+                conn = self._connect()
+                with self._lock:
+                    self._conn = conn
+                    self._checked_at = time.monotonic()
+            return conn
+
+    def invalidate(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn = None
+                self.reconnects += 1
+
+    def record_handshake(self, seconds):
+        with self._stats_lock:
+            self.handshakes += 1
+            self.handshake_seconds += seconds
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "handshakes": self.handshakes,
+                "avg_handshake_ms": round(self.handshake_seconds / self.handshakes * 1000, 1) if self.handshakes else 0.0,
+                "requests": self.requests,
+                "reconnects": self.reconnects,
+            }
+
+
+heroku_connections = HerokuConnectionManager(HEROKU_AUTH_TOKEN, HEROKU_POOL_SIZE, HEROKU_HEALTHCHECK_INTERVAL)
+
+
+def verify_api_key(conn):
+    # heroku3's _verify_api_key, except that a 429 raises so the gateway
+    # retries it instead of reading it as a rejected key.
+    r = conn._session.get(conn._url_for("account/rate-limits"))
+    if r.status_code == 429:
+        r.raise_for_status()
+    conn._api_key_verified = r.ok
+    return r.ok
+
+
+def is_rate_limited(error):
+    if isinstance(error, RateLimitExceeded):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code == 429
+
+
+def is_connection_failure(error):
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code in (401, 403)
 
 
 def get_heroku_conn():
@@ -44,15 +605,1054 @@ def get_heroku_conn():
         logger.error("HEROKU_AUTH_TOKEN not set!")
         return None
     try:
-        return heroku3.from_key(HEROKU_AUTH_TOKEN)
+        return heroku_connections.get()
     except Exception as e:
+        if is_rate_limited(e):
+            raise
         logger.error(f"Failed to connect to Heroku: {e}")
         return None
 
-user_authenticated = {}
+
+class HerokuGateway:
+    # heroku3 is blocking, so every call is pushed onto a bounded thread pool
+    # and awaited with a timeout to keep the dispatcher responsive. Background
+    # calls are capped at background_workers threads, so the rest of the pool
+    # is always free for interactive ones.
+    def __init__(self, max_workers, timeout, background_workers):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="heroku")
+        self._background_slots = asyncio.Semaphore(background_workers)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.timed_out = 0
+
+    def _invoke(self, func, args, kwargs):
+        with self._lock:
+            self.queued -= 1
+            self.in_flight += 1
+        request_budget.prepaid = True
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if is_connection_failure(e):
+                heroku_connections.invalidate()
+            raise
+        finally:
+            if request_budget.prepaid:
+                # The call made no request, e.g. get_heroku_conn on a live connection.
+                request_budget.prepaid = False
+                heroku_rate_governor.refund()
+            metrics.observe("heroku_call_seconds", time.perf_counter() - started, call=getattr(func, "__qualname__", str(func)))
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    async def run(self, func, *args, timeout=None, priority=PRIORITY_INTERACTIVE, **kwargs):
+        if priority == PRIORITY_INTERACTIVE:
+            return await self._run(func, args, kwargs, timeout, priority)
+        async with self._background_slots:
+            return await self._run(func, args, kwargs, timeout, priority)
+
+    async def _run(self, func, args, kwargs, timeout, priority):
+        for attempt in range(HEROKU_RATE_LIMIT_RETRIES + 1):
+            await heroku_rate_governor.admit(priority)
+            try:
+                return await self._submit(func, args, kwargs, timeout)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == HEROKU_RATE_LIMIT_RETRIES:
+                    raise
+                delay = heroku_rate_governor.back_off(attempt)
+                logger.warning(f"Heroku rate limit hit in {getattr(func, '__name__', func)}, retrying in {delay:.1f}s")
+
+    async def _submit(self, func, args, kwargs, timeout):
+        with self._lock:
+            self.queued += 1
+        future = self._executor.submit(self._invoke, func, args, kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # Only calls still waiting in the queue can be cancelled; a call that
+            # already started runs to completion in its worker thread.
+            if future.cancel():
+                heroku_rate_governor.refund()
+                with self._lock:
+                    self.queued -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                with self._lock:
+                    self.timed_out += 1
+                logger.warning(f"Heroku call {getattr(func, '__name__', func)} timed out after {timeout or self.timeout}s")
+            raise
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "timed_out": self.timed_out,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+heroku_gateway = HerokuGateway(HEROKU_MAX_WORKERS, HEROKU_CALL_TIMEOUT, HEROKU_BACKGROUND_WORKERS)
+
+
+class AppIndex:
+    # Apps sorted by lowercase name: prefix lookups bisect into the sorted
+    # names, substring matches fall back to a scan that is cached per query.
+    MAX_CACHED_SEARCHES = 64
+
+    def __init__(self, apps):
+        entries = sorted(((app.name.lower(), app) for app in apps), key=lambda entry: entry[0])
+        self._names = [name for name, _ in entries]
+        self.apps = [app for _, app in entries]
+        self._searches = {}
+
+    def search(self, text):
+        text = text.strip().lower()
+        if text in self._searches:
+            return self._searches[text]
+        start = bisect.bisect_left(self._names, text)
+        end = start
+        while end < len(self._names) and self._names[end].startswith(text):
+            end += 1
+        matches = self.apps[start:end]
+        matches += [
+            app for i, (name, app) in enumerate(zip(self._names, self.apps))
+            if text in name and not start <= i < end
+        ]
+        if len(self._searches) >= self.MAX_CACHED_SEARCHES:
+            self._searches.pop(next(iter(self._searches)))
+        self._searches[text] = matches
+        return matches
+
+
+class AppCatalog:
+    # Shared app list for every menu. Pages are fetched with Range pagination
+    # and revalidated with If-None-Match, so an unchanged list costs only 304s.
+    def __init__(self, ttl, page_size):
+        self.ttl = ttl
+        self.page_size = page_size
+        self._apps = None
+        self._raw_by_id = {}
+        self._pages = {}
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self.index = AppIndex([])
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.not_modified = 0
+
+    def _fetch(self, heroku_conn):
+        pages = {}
+        items = []
+        range_header = f"name ..; max={self.page_size};"
+        while range_header:
+            cached = self._pages.get(range_header)
+            headers = {"Range": range_header}
+            if cached and cached[0]:
+                headers["If-None-Match"] = cached[0]
+            r = heroku_conn._session.get(heroku_conn._url_for("apps"), headers=headers)
+            if r.status_code == 304 and cached:
+                etag, page_items, next_range = cached
+                self.not_modified += 1
+            else:
+                r.raise_for_status()
+                etag = r.headers.get("ETag")
+                page_items = r.json()
+                next_range = r.headers.get("Next-Range") if r.status_code == 206 else None
+            pages[range_header] = (etag, page_items, next_range)
+            items.extend(page_items)
+            range_header = next_range
+        self._pages = pages
+        return items
+
+    def is_fresh(self):
+        return self._apps is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    async def _refresh_locked(self, heroku_conn, priority=PRIORITY_INTERACTIVE):
+        items = await heroku_gateway.run(self._fetch, heroku_conn, priority=priority)
+        self._raw_by_id = {item["id"]: item for item in items}
+        self._apps = [App.new_from_dict(item, h=heroku_conn) for item in items]
+        self.index = AppIndex(self._apps)
+        self._fetched_at = time.monotonic()
+        self.refreshes += 1
+        return self._apps
+
+    async def refresh(self, heroku_conn, priority=PRIORITY_INTERACTIVE):
+        async with self._lock:
+            return await self._refresh_locked(heroku_conn, priority)
+
+    async def get(self, heroku_conn, priority=PRIORITY_INTERACTIVE):
+        if self.is_fresh():
+            self.hits += 1
+            return self._apps
+        self.misses += 1
+        async with self._lock:
+            if self.is_fresh():
+                return self._apps
+            return await self._refresh_locked(heroku_conn, priority)
+
+    def lookup(self, heroku_conn, app_id):
+        raw = self._raw_by_id.get(app_id)
+        return App.new_from_dict(raw, h=heroku_conn) if raw else None
+
+    def invalidate(self):
+        # Keep the ETags so the forced refetch is still a conditional request.
+        self._fetched_at = 0.0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "apps": len(self._apps or []),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "not_modified_pages": self.not_modified,
+        }
+
+
+app_catalog = AppCatalog(APP_CATALOG_TTL, APP_CATALOG_PAGE_SIZE)
+
+
+def conditional_get(heroku_conn, etag, *path, headers=None):
+    # Returns (etag, body), or (etag, None) when Heroku answers 304 Not Modified.
+    headers = dict(headers or {})
+    if etag:
+        headers["If-None-Match"] = etag
+    r = heroku_conn._session.get(heroku_conn._url_for(*path), headers=headers)
+    if r.status_code == 304 and etag:
+        return etag, None
+    r.raise_for_status()
+    return r.headers.get("ETag"), r.json()
+
+
+class ConfigSnapshot:
+    # Config vars of one app with the keys kept sorted, so an ENV page is a
+    # slice and a single change is a bisect insert or delete.
+    def __init__(self, config, etag):
+        self.values = dict(config)
+        self.keys = sorted(self.values)
+        self.etag = etag
+        self.fetched_at = time.monotonic()
+
+    def page(self, start, end):
+        return [(key, self.values[key]) for key in self.keys[start:end]]
+
+    def apply(self, changes):
+        for key, value in changes.items():
+            if value is None:
+                if key in self.values:
+                    del self.values[key]
+                    del self.keys[bisect.bisect_left(self.keys, key)]
+            else:
+                if key not in self.values:
+                    bisect.insort(self.keys, key)
+                self.values[key] = value
+
+    def diff(self, config):
+        changes = {key: value for key, value in config.items() if self.values.get(key) != value}
+        changes.update({key: None for key in self.values if key not in config})
+        return changes
+
+
+class ConfigCache:
+    # Per-app config snapshots shared by every operator. Stale entries are
+    # served immediately while a conditional GET revalidates them in the
+    # background, and the config returned by our own PATCHes is applied as-is.
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._locks = {}
+        self._revalidating = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.local_updates = 0
+
+    def _fetch(self, heroku_conn, app_id, etag):
+        return conditional_get(heroku_conn, etag, "apps", app_id, "config-vars")
+
+    async def _load(self, heroku_conn, app_id, priority=PRIORITY_INTERACTIVE):
+        lock = self._locks.setdefault(app_id, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(app_id)
+            etag, config = await heroku_gateway.run(
+                self._fetch, heroku_conn, app_id, entry.etag if entry else None, priority=priority
+            )
+            if entry is not None and config is None:
+                self.not_modified += 1
+            elif entry is not None:
+                entry.apply(entry.diff(config))
+                entry.etag = etag
+            else:
+                entry = self._entries[app_id] = ConfigSnapshot(config, etag)
+            entry.fetched_at = time.monotonic()
+            return entry
+
+    async def _revalidate(self, heroku_conn, app_id):
+        try:
+            await self._load(heroku_conn, app_id, PRIORITY_BACKGROUND)
+        except Exception as e:
+            logger.warning(f"Background ENV revalidation failed for app {app_id}: {e}")
+        finally:
+            self._revalidating.discard(app_id)
+
+    async def get(self, heroku_conn, app_id):
+        entry = self._entries.get(app_id)
+        if entry is None:
+            self.misses += 1
+            return await self._load(heroku_conn, app_id)
+        if time.monotonic() - entry.fetched_at < self.ttl:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+            if app_id not in self._revalidating:
+                self._revalidating.add(app_id)
+                asyncio.get_running_loop().create_task(self._revalidate(heroku_conn, app_id))
+        return entry
+
+    def peek(self, app_id):
+        return self._entries.get(app_id)
+
+    def replace(self, app_id, config):
+        # A config PATCH answers with the full config, which is as good as a refetch.
+        entry = self._entries.get(app_id)
+        if entry is None:
+            self._entries[app_id] = ConfigSnapshot(config, None)
+        else:
+            entry.apply(entry.diff(config))
+            entry.etag = None
+            entry.fetched_at = time.monotonic()
+        self.local_updates += 1
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "apps": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "local_updates": self.local_updates,
+        }
+
+
+config_cache = ConfigCache(ENV_CACHE_TTL)
+
+
+class DynoStatusCache:
+    # Formation and dyno lists per app, kept for a short TTL so refreshing the
+    # dyno panel does not refetch on every tap. Refetches are conditional, so
+    # unchanged lists only cost a 304.
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._etags = {}
+        self._locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    async def _load(self, heroku_conn, app_id, resource, priority):
+        etag, cached = self._etags.get((app_id, resource), (None, None))
+        etag, body = await heroku_gateway.run(conditional_get, heroku_conn, etag, "apps", app_id, resource, priority=priority)
+        if body is None:
+            self.not_modified += 1
+            return cached
+        self._etags[(app_id, resource)] = (etag, body)
+        return body
+
+    async def get(self, heroku_conn, app_id, max_age=None, priority=PRIORITY_INTERACTIVE):
+        max_age = self.ttl if max_age is None else max_age
+        entry = self._entries.get(app_id)
+        if entry is not None and time.monotonic() - entry["fetched_at"] < max_age:
+            self.hits += 1
+            return entry
+        async with self._locks.setdefault(app_id, asyncio.Lock()):
+            entry = self._entries.get(app_id)
+            if entry is not None and time.monotonic() - entry["fetched_at"] < max_age:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            formation, dynos = await asyncio.gather(
+                self._load(heroku_conn, app_id, "formation", priority),
+                self._load(heroku_conn, app_id, "dynos", priority),
+            )
+            entry = self._entries[app_id] = {"formation": formation, "dynos": dynos, "fetched_at": time.monotonic()}
+            return entry
+
+    def invalidate(self, app_id):
+        self._entries.pop(app_id, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "apps": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "not_modified": self.not_modified,
+        }
+
+
+dyno_status = DynoStatusCache(DYNO_STATUS_TTL)
+
+
+class AppWatcher:
+    # Checks the watched apps for crashed dynos and failed releases. Only
+    # releases newer than the last version seen are requested, and the same
+    # range is revalidated with If-None-Match, so a quiet app costs a 304. The
+    # last version and the crashed dynos per app live in bot_data, so a restart
+    # of the bot neither repeats nor misses alerts. When checking every app
+    # each interval would take more than WATCH_BUDGET_SHARE of the Heroku
+    # budget, each app is checked less often and the checks are spread over
+    # the polls.
+    def __init__(self, apps, interval):
+        self.apps = apps
+        self.interval = interval
+        self._etags = {}
+        self._due = {}
+        self._warned_period = None
+        self.polls = 0
+        self.not_modified = 0
+        self.alerts = 0
+        self.errors = 0
+
+    def select(self, apps):
+        if "*" in self.apps:
+            return list(apps)
+        wanted = set(self.apps)
+        return [app for app in apps if app.name in wanted or app.id in wanted]
+
+    async def _latest_version(self, heroku_conn, app_id):
+        _, releases = await heroku_gateway.run(
+            conditional_get, heroku_conn, None, "apps", app_id, "releases",
+            headers={"Range": "version ..; max=1, order=desc;"}, priority=PRIORITY_BACKGROUND
+        )
+        return releases[0]["version"] if releases else 0
+
+    async def _new_releases(self, heroku_conn, app_id, last_version):
+        range_header = f"version ]{last_version}..; max={WATCH_RELEASES_PER_POLL};"
+        etag, cached_range = self._etags.get(app_id, (None, None))
+        etag, releases = await heroku_gateway.run(
+            conditional_get, heroku_conn, etag if cached_range == range_header else None, "apps", app_id, "releases",
+            headers={"Range": range_header}, priority=PRIORITY_BACKGROUND
+        )
+        if releases is None:
+            self.not_modified += 1
+            return []
+        self._etags[app_id] = (etag, range_header)
+        return sorted(releases, key=lambda release: release["version"])
+
+    async def check(self, heroku_conn, app, seen):
+        alerts = []
+        status = await dyno_status.get(heroku_conn, app.id, max_age=self.interval / 2, priority=PRIORITY_BACKGROUND)
+        crashed = sorted(dyno["name"] for dyno in status["dynos"] if dyno["state"] == "crashed")
+        newly_crashed = [name for name in crashed if name not in seen.get("crashed", [])]
+        if newly_crashed:
+            alerts.append(f"❌ `{app.name}`: dyno(s) crashed: " + ", ".join(f"`{name}`" for name in newly_crashed))
+        elif seen.get("crashed") and not crashed:
+            alerts.append(f"✅ `{app.name}`: all dynos are running again.")
+        seen["crashed"] = crashed
+
+        if "release" not in seen:
+            # First look at this app: start from its current release instead
+            # of reporting its whole history.
+            seen["release"] = await self._latest_version(heroku_conn, app.id)
+            return alerts
+        for release in await self._new_releases(heroku_conn, app.id, seen["release"]):
+            if release["status"] == "pending":
+                break
+            if release["status"] == "failed":
+                description = escape_markdown(release.get('description') or '')
+                alerts.append(f"❌ `{app.name}`: release v{release['version']} failed: {description}")
+            seen["release"] = release["version"]
+        return alerts
+
+    async def poll(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        heroku_conn = await heroku_gateway.run(get_heroku_conn, priority=PRIORITY_BACKGROUND)
+        if not heroku_conn:
+            return
+        try:
+            apps = self.select(await app_catalog.get(heroku_conn, priority=PRIORITY_BACKGROUND))
+        except Exception as e:
+            logger.warning(f"App watcher could not list apps: {e}")
+            return
+        due = self._schedule(apps)
+        watched = context.bot_data.setdefault('watched_apps', {})
+        # Start the checks evenly over the first half of the interval, a few at a time.
+        spacing = self.interval / 2 / len(due) if due else 0
+        semaphore = asyncio.Semaphore(WATCH_CONCURRENCY)
+
+        async def check_in_turn(index, app):
+            await asyncio.sleep(index * spacing)
+            async with semaphore:
+                try:
+                    alerts = await self.check(heroku_conn, app, watched.setdefault(app.id, {}))
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning(f"App watcher could not check app {app.name}: {e}")
+                    return
+            for text in alerts:
+                await self.notify(context, text)
+
+        await asyncio.gather(*(check_in_turn(index, app) for index, app in enumerate(due)))
+        self.polls += 1
+
+    def period(self, app_count):
+        # Seconds between two checks of one app.
+        budget_per_hour = HEROKU_RATE_LIMIT * WATCH_BUDGET_SHARE
+        return max(self.interval, app_count * WATCH_REQUESTS_PER_CHECK * 3600 / budget_per_hour)
+
+    def _schedule(self, apps):
+        if not apps:
+            self._due = {}
+            return []
+        period = self.period(len(apps))
+        if period > self.interval and period != self._warned_period:
+            self._warned_period = period
+            logger.warning(
+                f"Checking {len(apps)} apps every {self.interval:g}s would exceed the watcher's share of the "
+                f"Heroku API budget; each app is checked every {period:.0f}s instead."
+            )
+        now = time.monotonic()
+        # New apps get start times spread over the stretch beyond one interval.
+        offset = (period - self.interval) / len(apps)
+        self._due = {app.id: self._due.get(app.id, now + index * offset) for index, app in enumerate(apps)}
+        due = [app for app in apps if self._due[app.id] <= now]
+        for app in due:
+            # Half an interval early, so a poll that fires slightly early still picks it up.
+            self._due[app.id] = now + period - self.interval / 2
+        return due
+
+    async def notify(self, context: ContextTypes.DEFAULT_TYPE, text) -> None:
+        metrics.inc("watcher_alerts_total")
+        self.alerts += 1
+        for user_id, authenticated in list(authenticated_users(context).items()):
+            if not authenticated:
+                continue
+            try:
+                await context.bot.send_message(chat_id=user_id, text=text, parse_mode='Markdown')
+            except Forbidden:
+                logger.warning(f"User {user_id} blocked the bot, skipping alerts for them.")
+            except Exception as e:
+                logger.warning(f"Could not deliver an alert to user {user_id}: {e}")
+
+    def stats(self):
+        return {
+            "apps": len(self._due),
+            "polls": self.polls,
+            "not_modified": self.not_modified,
+            "alerts": self.alerts,
+            "errors": self.errors,
+        }
+
+
+app_watcher = AppWatcher(WATCH_APPS, WATCH_INTERVAL)
+
+
+async def get_app(heroku_conn, app_id):
+    app = app_catalog.lookup(heroku_conn, app_id)
+    if app is None:
+        app = await heroku_gateway.run(heroku_conn.app, app_id)
+    return app
+
+
+async def refresh_app_catalog(context: ContextTypes.DEFAULT_TYPE) -> None:
+    heroku_conn = await heroku_gateway.run(get_heroku_conn, priority=PRIORITY_BACKGROUND)
+    if not heroku_conn:
+        return
+    try:
+        await app_catalog.refresh(heroku_conn, priority=PRIORITY_BACKGROUND)
+    except Exception as e:
+        logger.warning(f"Background app catalog refresh failed: {e}")
+
+async def watch_apps(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await app_watcher.poll(context)
+
+def retry_after_seconds(error):
+    delay = error.retry_after
+    return delay.total_seconds() if hasattr(delay, "total_seconds") else delay
+
+
+def chunk_log_lines(lines, limit):
+    # Split on line boundaries; a single line longer than the limit is split
+    # into pieces that each fill a chunk of their own.
+    chunk, size = [], 0
+    for line in lines:
+        pieces = [line[i:i + limit] for i in range(0, len(line), limit)] or [line]
+        for piece in pieces:
+            if chunk and size + len(piece) + 1 > limit:
+                yield "\n".join(chunk)
+                chunk, size = [], 0
+            chunk.append(piece)
+            size += len(piece) + 1
+    if chunk:
+        yield "\n".join(chunk)
+
+
+async def send_log_chunk(bot, chat_id, text):
+    while True:
+        try:
+            try:
+                return await bot.send_message(chat_id=chat_id, text=f"```\n{text}\n```", parse_mode='Markdown')
+            except BadRequest:
+                # Log lines can contain backticks that break the Markdown block.
+                return await bot.send_message(chat_id=chat_id, text=text)
+        except RetryAfter as e:
+            await asyncio.sleep(retry_after_seconds(e))
+
+
+def build_log_document(app_name, logs, compress):
+    data = logs.encode("utf-8")
+    filename = f"{app_name}-logs.txt"
+    if compress:
+        data = gzip.compress(data)
+        filename += ".gz"
+    return InputFile(io.BytesIO(data), filename=filename)
+
+
+def create_log_session(heroku_conn, app_id, lines, tail):
+    r = heroku_conn._session.post(
+        heroku_conn._url_for("apps", app_id, "log-sessions"), json={"lines": lines, "tail": tail}
+    )
+    r.raise_for_status()
+    return r.json()["logplex_url"]
+
+
+class LogFollower:
+    # A reader thread pulls a tail=true log session line by line into a bounded
+    # queue; when the queue is full the thread blocks, which in turn stops
+    # reading from the socket. The consumer batches lines into messages on a
+    # flush interval or size threshold and backs off on Telegram flood limits.
+    _STREAM_ENDED = object()
+
+    def __init__(self, bot, chat_id, status_message_id, app_name, logplex_url):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.status_message_id = status_message_id
+        self.app_name = app_name
+        self.logplex_url = logplex_url
+        self.stopped_by_user = False
+        self._stopped = threading.Event()
+        self._response = None
+        self._queue = asyncio.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.task = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        threading.Thread(target=self._pump, args=(loop,), name=f"logs-{self.app_name}", daemon=True).start()
+        self.task = asyncio.create_task(self._consume())
+
+    def _pump(self, loop):
+        try:
+            with requests.get(self.logplex_url, stream=True, timeout=(10, LOG_IDLE_TIMEOUT)) as response:
+                self._response = response
+                response.raise_for_status()
+                for line in response.iter_lines(chunk_size=None):
+                    if self._stopped.is_set():
+                        return
+                    if line and not self._put(loop, line.decode("utf-8", "replace")):
+                        return
+        except Exception as e:
+            if not self._stopped.is_set():
+                logger.warning(f"Log stream for {self.app_name} ended: {e}")
+        finally:
+            if not self._stopped.is_set():
+                self._put(loop, self._STREAM_ENDED)
+
+    def _put(self, loop, item):
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=1)
+                return True
+            except concurrent.futures.TimeoutError:
+                if self._stopped.is_set():
+                    future.cancel()
+                    return False
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        lines, size = [], 0
+        now = loop.time()
+        flush_at = now + LOG_FLUSH_INTERVAL
+        idle_at = now + LOG_IDLE_TIMEOUT
+        stop_at = now + LOG_FOLLOW_MAX_DURATION
+        reason = "the log stream ended"
+        try:
+            while not self._stopped.is_set():
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), max(0, min(flush_at, idle_at) - loop.time()))
+                except asyncio.TimeoutError:
+                    item = None
+                if item is self._STREAM_ENDED:
+                    break
+                now = loop.time()
+                if item is not None:
+                    lines.append(item)
+                    size += len(item) + 1
+                    idle_at = now + LOG_IDLE_TIMEOUT
+                if now >= idle_at:
+                    reason = f"no new lines for {int(LOG_IDLE_TIMEOUT)}s"
+                    break
+                if now >= stop_at:
+                    reason = f"the {int(LOG_FOLLOW_MAX_DURATION)}s limit was reached"
+                    break
+                if size >= LOG_FLUSH_SIZE or now >= flush_at:
+                    await self._flush(lines)
+                    lines, size = [], 0
+                    flush_at = loop.time() + LOG_FLUSH_INTERVAL
+            await self._flush(lines)
+        except asyncio.CancelledError:
+            reason = "the bot is shutting down"
+        finally:
+            self.stop()
+            if log_followers.get(self.chat_id) is self:
+                del log_followers[self.chat_id]
+        if not self.stopped_by_user:
+            await self._finish(reason)
+
+    async def _flush(self, lines):
+        for chunk in chunk_log_lines(lines, TELEGRAM_MESSAGE_LIMIT - 8):
+            await send_log_chunk(self.bot, self.chat_id, chunk)
+
+    async def _finish(self, reason):
+        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data="main_menu")]]
+        try:
+            await self.bot.edit_message_text(
+                f"Stopped following logs for `{self.app_name}`: {reason}.",
+                chat_id=self.chat_id,
+                message_id=self.status_message_id,
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode='Markdown',
+            )
+        except Exception as e:
+            logger.warning(f"Could not update log follow status for {self.app_name}: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        response = self._response
+        if response is None:
+            return
+        # Shutting the socket down unblocks a reader waiting on a quiet stream.
+        # response.close() would wait for the buffer lock the reader holds.
+        sock = getattr(getattr(response.raw, "_connection", None), "sock", None)
+        try:
+            if sock is not None:
+                sock.shutdown(socket.SHUT_RDWR)
+            else:
+                threading.Thread(target=response.close, daemon=True).start()
+        except OSError:
+            pass
+
+
+log_followers = {}
+
+
+async def stop_log_follower(chat_id):
+    follower = log_followers.pop(chat_id, None)
+    if follower:
+        follower.stopped_by_user = True
+        follower.stop()
+        await follower.task
+
+
+def is_retryable_heroku_error(error):
+    if isinstance(error, RateLimitExceeded):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and (response.status_code == 429 or response.status_code >= 500)
+
+
+async def fan_out(apps, operation, on_progress):
+    # Runs operation(app) for every app with at most FANOUT_CONCURRENCY in
+    # flight. 429 and 5xx responses are retried with full-jitter backoff; the
+    # concurrency slot is released while waiting.
+    semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
+    results = {}
+
+    async def run_one(app):
+        for attempt in range(FANOUT_MAX_RETRIES + 1):
+            try:
+                async with semaphore:
+                    await operation(app)
+                results[app.name] = None
+                break
+            except Exception as e:
+                if attempt == FANOUT_MAX_RETRIES or not is_retryable_heroku_error(e):
+                    results[app.name] = e
+                    break
+                await asyncio.sleep(random.uniform(0, min(30, 2 ** attempt)))
+        await on_progress(len(results), len(apps))
+
+    await asyncio.gather(*(run_one(app) for app in apps))
+    return results
+
+
+class ThrottledProgress:
+    # Edits one status message at most once per interval; the final update is
+    # always sent.
+    def __init__(self, bot, chat_id, message_id, interval):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.interval = interval
+        self._last = 0.0
+
+    async def update(self, text, reply_markup=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last < self.interval:
+            return
+        self._last = now
+        try:
+            await self.bot.edit_message_text(
+                text, chat_id=self.chat_id, message_id=self.message_id, reply_markup=reply_markup, parse_mode='Markdown'
+            )
+        except RetryAfter as e:
+            if force:
+                await asyncio.sleep(retry_after_seconds(e))
+                await self.update(text, reply_markup, force)
+        except BadRequest as e:
+            logger.warning(f"Could not update progress message: {e}")
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    # Processes updates from different users concurrently while each user's
+    # updates run one at a time in arrival order, so conversation state and
+    # user_data never see interleaved handlers. The base semaphore only caps
+    # pending updates; the worker semaphore caps the ones actually running.
+    def __init__(self, concurrency, max_pending):
+        super().__init__(max_pending)
+        self.concurrency = concurrency
+        self._workers = asyncio.Semaphore(concurrency)
+        self._lanes = {}
+        self.running = 0
+        self.wait = metrics.histogram("bot_update_wait_seconds")
+        self.handling = metrics.histogram("bot_update_handling_seconds")
+
+    @staticmethod
+    def _lane_key(update):
+        if isinstance(update, Update):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return f"chat:{update.effective_chat.id}"
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        received = time.perf_counter()
+        key = self._lane_key(update)
+        if key is None:
+            async with self._workers:
+                started = time.perf_counter()
+                await self._run(coroutine)
+        else:
+            # Taking the lane lock happens before any await, so tasks created
+            # in arrival order queue on it in arrival order.
+            lane = self._lanes.setdefault(key, [asyncio.Lock(), 0])
+            lane[1] += 1
+            try:
+                async with lane[0], self._workers:
+                    started = time.perf_counter()
+                    await self._run(coroutine)
+            finally:
+                lane[1] -= 1
+                if not lane[1]:
+                    del self._lanes[key]
+        self.wait.record(started - received)
+        self.handling.record(time.perf_counter() - started)
+
+    async def _run(self, coroutine):
+        self.running += 1
+        try:
+            await coroutine
+        finally:
+            self.running -= 1
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def stats(self):
+        return {
+            "processed": self.handling.count,
+            "running": self.running,
+            "active_users": len(self._lanes),
+            "wait_ms": self.wait.percentiles(),
+            "handling_ms": self.handling.percentiles(),
+        }
+
+
+update_processor = PerUserUpdateProcessor(UPDATE_CONCURRENCY, UPDATE_MAX_PENDING)
+
+
+class SQLiteStateStore:
+    # Pickled state rows in one SQLite table keyed by (kind, key). The file is
+    # opened on first use, and all access happens in worker threads.
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                "kind TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (kind, key))"
+            )
+        return self._db
+
+    def load(self, kind):
+        with self._lock:
+            rows = self._connect().execute("SELECT key, value FROM state WHERE kind = ?", (kind,)).fetchall()
+        return {key: pickle.loads(value) for key, value in rows}
+
+    def write(self, upserts, deletes):
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO state (kind, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                    [(kind, key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now) for (kind, key), value in upserts.items()],
+                )
+                db.executemany("DELETE FROM state WHERE kind = ? AND key = ?", list(deletes))
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class StatePersistence(BasePersistence):
+    # Persists auth state (kept in bot_data), user_data and conversation
+    # states through a store with load/write/close. PTB hands over changes
+    # every update_interval; they are staged here and written behind in one
+    # transaction off the event loop.
+    def __init__(self, store, update_interval):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.store = store
+        self._upserts = {}
+        self._deletes = set()
+        self._writer = None
+        self.writes = 0
+        self.rows_written = 0
+
+    def _stage(self, kind, key, value):
+        row = (kind, json.dumps(key))
+        if value is None:
+            self._upserts.pop(row, None)
+            self._deletes.add(row)
+        else:
+            self._deletes.discard(row)
+            self._upserts[row] = value
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write_behind())
+
+    async def _write_behind(self):
+        # PTB gathers all update_* calls of one run, so by the time this task
+        # starts the whole run is staged and goes out as a single batch.
+        while self._upserts or self._deletes:
+            upserts, deletes = self._upserts, self._deletes
+            self._upserts, self._deletes = {}, set()
+            try:
+                await asyncio.to_thread(self.store.write, upserts, deletes)
+                self.writes += 1
+                self.rows_written += len(upserts) + len(deletes)
+            except Exception as e:
+                logger.error(f"Failed to persist bot state: {e}")
+                for row, value in upserts.items():
+                    self._upserts.setdefault(row, value)
+                self._deletes |= deletes - set(self._upserts)
+                return
+
+    async def _load(self, kind):
+        return await asyncio.to_thread(self.store.load, kind)
+
+    async def get_user_data(self):
+        return {json.loads(key): data for key, data in (await self._load("user_data")).items()}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return (await self._load("bot_data")).get(json.dumps("bot"), {})
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        rows = await self._load(f"conversation:{name}")
+        return {tuple(json.loads(key)): state for key, state in rows.items()}
+
+    async def update_conversation(self, name, key, new_state):
+        self._stage(f"conversation:{name}", list(key), new_state)
+
+    async def update_user_data(self, user_id, data):
+        self._stage("user_data", user_id, data)
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        self._stage("bot_data", "bot", data)
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def drop_user_data(self, user_id):
+        self._stage("user_data", user_id, None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        if self._writer is not None:
+            await self._writer
+        await self._write_behind()
+        await asyncio.to_thread(self.store.close)
+
+    def stats(self):
+        return {"writes": self.writes, "rows_written": self.rows_written, "pending": len(self._upserts) + len(self._deletes)}
+
+
+def authenticated_users(context: ContextTypes.DEFAULT_TYPE) -> dict:
+    # Lives in bot_data so logins survive restarts when persistence is enabled.
+    return context.bot_data.setdefault('user_authenticated', {})
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = update.message.from_user.id
+    user_authenticated = authenticated_users(context)
     if user_id in user_authenticated and user_authenticated[user_id]:
         await show_main_menu(update, context)
         return SELECTING_ACTION
@@ -69,7 +1669,7 @@ async def check_password(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     provided_password = update.message.text
 
     if provided_password == BOT_PASSWORD:
-        user_authenticated[user_id] = True
+        authenticated_users(context)[user_id] = True
         await update.message.reply_text("Authentication successful!")
         await show_main_menu(update, context)
         return SELECTING_ACTION
@@ -78,35 +1678,35 @@ async def check_password(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return "PASSWORD"
 
 
-async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    context.user_data.pop('env_vars', None)
+async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, notice: str = None):
+    context.user_data.pop('env_changes', None)
     context.user_data.pop('selected_app_id', None)
     
     keyboard = [
-        [InlineKeyboardButton("Restart Dynos", callback_data="restart_dynos")],
+        [InlineKeyboardButton("Manage Dynos", callback_data="restart_dynos")],
         [InlineKeyboardButton("View Logs", callback_data="view_logs")],
         [InlineKeyboardButton("Manage ENVs", callback_data="manage_envs")],
         [InlineKeyboardButton("List Apps", callback_data="list_apps")],
+        [InlineKeyboardButton("Bulk Actions", callback_data="bulk_actions")],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
+    message_text = f"{notice}\n\nPlease choose an action:" if notice else "Please choose an action:"
     
     if update.callback_query:
-        await update.callback_query.edit_message_text(
-            "Please choose an action:", reply_markup=reply_markup
-        )
+        await update.callback_query.edit_message_text(message_text, reply_markup=reply_markup)
     else:
-        await update.message.reply_text("Please choose an action:", reply_markup=reply_markup)
+        await update.message.reply_text(message_text, reply_markup=reply_markup)
 
 
 async def list_apps_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    heroku_conn = get_heroku_conn()
+    heroku_conn = await heroku_gateway.run(get_heroku_conn)
     if not heroku_conn:
         await query.edit_message_text("Error: Heroku connection failed.")
         return ConversationHandler.END
     try:
-        apps = heroku_conn.apps()
+        apps = await app_catalog.get(heroku_conn)
         if not apps:
             await query.edit_message_text("You have no applications on Heroku.")
             return ConversationHandler.END
@@ -122,128 +1722,576 @@ async def list_apps_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return SELECTING_ACTION
 
 async def ask_for_app_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, next_state: int, action_text: str) -> int:
+    await update.callback_query.answer()
+    context.user_data['app_picker'] = {'next_state': next_state, 'action_text': action_text, 'search': None}
+    return await show_app_picker(update, context)
+
+async def show_app_picker(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 0) -> int:
     query = update.callback_query
-    await query.answer()
-    heroku_conn = get_heroku_conn()
+    reply = query.edit_message_text if query else update.message.reply_text
+    picker = context.user_data.get('app_picker')
+    if not picker:
+        await reply("Error: Session expired. Please start over.")
+        return ConversationHandler.END
+    heroku_conn = await heroku_gateway.run(get_heroku_conn)
     if not heroku_conn:
-        await query.edit_message_text("Error: Heroku connection failed.")
+        await reply("Error: Heroku connection failed.")
         return ConversationHandler.END
     try:
-        apps = heroku_conn.apps()
-        if not apps:
-            await query.edit_message_text("You have no applications on Heroku.")
-            return ConversationHandler.END
-        keyboard = [
-            [InlineKeyboardButton(app.name, callback_data=f"app_{app.id}")] for app in apps
-        ]
-        keyboard.append([InlineKeyboardButton("⬅️ Back to Menu", callback_data="main_menu")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(f"Please select an app to {action_text}:", reply_markup=reply_markup)
-        return next_state
+        apps = await app_catalog.get(heroku_conn)
     except Exception as e:
         logger.error(f"Error fetching apps for selection: {e}")
-        await query.edit_message_text("An error occurred while fetching your apps.")
+        await reply("An error occurred while fetching your apps.")
         return ConversationHandler.END
+    if not apps:
+        await reply("You have no applications on Heroku.")
+        return ConversationHandler.END
+
+    search = picker['search']
+    matches = picker_matches(picker)
+    total_pages = (len(matches) + APPS_PER_PAGE - 1) // APPS_PER_PAGE or 1
+    page = min(max(page, 0), total_pages - 1)
+    picker['page'] = page
+    start_index = page * APPS_PER_PAGE
+    end_index = start_index + APPS_PER_PAGE
+
+    selected = context.user_data.get('bulk_selected', set()) if picker.get('multi') else None
+    keyboard = []
+    for app in matches[start_index:end_index]:
+        label = f"✅ {app.name}" if selected and app.id in selected else app.name
+        keyboard.append([InlineKeyboardButton(label, callback_data=f"app_{app.id}")])
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"apps_page_{page - 1}"))
+    if end_index < len(matches):
+        nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"apps_page_{page + 1}"))
+    if nav_buttons:
+        keyboard.append(nav_buttons)
+    if search:
+        keyboard.append([InlineKeyboardButton("✖️ Clear Search", callback_data="apps_search_clear")])
+    else:
+        keyboard.append([InlineKeyboardButton("🔍 Search", callback_data="apps_search")])
+    if selected is not None:
+        keyboard.append([
+            InlineKeyboardButton("☑️ Select Page", callback_data="bulk_select_page"),
+            InlineKeyboardButton("Clear", callback_data="bulk_clear"),
+        ])
+        keyboard.append([InlineKeyboardButton(f"➡️ Continue ({len(selected)} selected)", callback_data="bulk_continue")])
+    keyboard.append([InlineKeyboardButton("⬅️ Back to Menu", callback_data="main_menu")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    message_text = f"Please select an app to {picker['action_text']}:"
+    if search:
+        message_text += f"\nApps matching \"{search}\": {len(matches)}"
+    message_text += f" (Page {page + 1}/{total_pages})"
+    await reply(message_text, reply_markup=reply_markup)
+    return picker['next_state']
+
+def picker_matches(picker):
+    search = picker['search']
+    return app_catalog.index.search(search) if search else app_catalog.index.apps
+
+async def apps_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    page = int(query.data.split("_")[-1])
+    return await show_app_picker(update, context, page=page)
+
+async def app_search_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data="main_menu")]]
+    await query.edit_message_text("Please send part of the app name to search for.", reply_markup=InlineKeyboardMarkup(keyboard))
+    return SEARCHING_APPS
+
+async def app_search_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    picker = context.user_data.get('app_picker')
+    if picker:
+        picker['search'] = update.message.text.strip().lower()
+    return await show_app_picker(update, context)
+
+async def app_search_clear(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    context.user_data.get('app_picker', {})['search'] = None
+    return await show_app_picker(update, context)
+
+async def current_picker_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    return await show_app_picker(update, context, page=context.user_data.get('app_picker', {}).get('page', 0))
+
+def app_picker_handlers(select_callback):
+    return [
+        CallbackQueryHandler(select_callback, pattern="^app_"),
+        CallbackQueryHandler(apps_page_callback, pattern="^apps_page_"),
+        CallbackQueryHandler(app_search_start, pattern="^apps_search$"),
+        CallbackQueryHandler(app_search_clear, pattern="^apps_search_clear$"),
+    ]
 
 async def restart_dynos_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    return await ask_for_app_selection(update, context, SELECTING_APP_FOR_RESTART, "restart dynos for")
+    return await ask_for_app_selection(update, context, SELECTING_APP_FOR_RESTART, "manage dynos for")
+
+def dyno_sort_key(dyno):
+    process_type, _, number = dyno["name"].partition(".")
+    return process_type, int(number) if number.isdigit() else 0, dyno["name"]
+
+def describe_dyno_panel(app_name, status):
+    dynos = sorted(status["dynos"], key=dyno_sort_key)
+    formation = sorted(status["formation"], key=lambda f: f["type"])
+    groups = [(f["type"], f"`{f['type']}`: {f['quantity']} × {f['size']}") for f in formation]
+    groups += [(t, f"`{t}`") for t in sorted({d["type"] for d in dynos} - {f["type"] for f in formation})]
+    lines = [f"Dynos for `{app_name}`:"]
+    for process_type, heading in groups:
+        lines.append(f"\n{heading}")
+        of_type = [d for d in dynos if d["type"] == process_type]
+        for dyno in of_type[:DYNO_PANEL_MAX_DYNOS]:
+            lines.append(f"{DYNO_STATE_ICONS.get(dyno['state'], '❔')} `{dyno['name']}` {dyno['state']}")
+        if len(of_type) > DYNO_PANEL_MAX_DYNOS:
+            lines.append(f"...and {len(of_type) - DYNO_PANEL_MAX_DYNOS} more")
+        if not of_type:
+            lines.append("No dynos running.")
+    if not groups:
+        lines.append("\nThis app has no process types yet.")
+    lines.append(f"\nStatus as of {int(time.monotonic() - status['fetched_at'])}s ago.")
+    return "\n".join(lines)
+
+def dyno_panel_markup(status):
+    keyboard = []
+    for formation in sorted(status["formation"], key=lambda f: f["type"]):
+        keyboard.append([
+            InlineKeyboardButton(f"🔄 Restart {formation['type']}", callback_data=f"dyno_rtype_{formation['type']}"),
+            InlineKeyboardButton(f"⚖️ Scale {formation['type']}", callback_data=f"dyno_scale_{formation['type']}"),
+        ])
+    dynos = [d for d in sorted(status["dynos"], key=dyno_sort_key) if d["type"] != "run"][:DYNO_PANEL_MAX_DYNOS]
+    buttons = [InlineKeyboardButton(f"🔄 {d['name']}", callback_data=f"dyno_rone_{d['name']}") for d in dynos]
+    keyboard.extend(buttons[i:i + 3] for i in range(0, len(buttons), 3))
+    keyboard.append([
+        InlineKeyboardButton("🔄 Rolling Restart All", callback_data="dyno_rall"),
+        InlineKeyboardButton("♻️ Restart All Now", callback_data="dyno_rnow"),
+    ])
+    keyboard.append([
+        InlineKeyboardButton("🔃 Refresh", callback_data="dyno_refresh"),
+        InlineKeyboardButton("⬅️ Back to Menu", callback_data="main_menu"),
+    ])
+    return InlineKeyboardMarkup(keyboard)
+
+async def show_dyno_panel(update: Update, context: ContextTypes.DEFAULT_TYPE, notice: str = None) -> int:
+    query = update.callback_query
+    app_id = context.user_data.get('dyno_app_id')
+    if not app_id:
+        await show_main_menu(update, context, notice="Session expired. Please pick the app again.")
+        return SELECTING_ACTION
+    heroku_conn = await heroku_gateway.run(get_heroku_conn)
+    if not heroku_conn:
+        await query.edit_message_text("Error: Heroku connection failed.")
+        return ConversationHandler.END
+    try:
+        app = await get_app(heroku_conn, app_id)
+        status = await dyno_status.get(heroku_conn, app.id)
+    except Exception as e:
+        logger.error(f"Error fetching dynos for app {app_id}: {e}")
+        await show_main_menu(update, context, notice="An error occurred while fetching the dynos.")
+        return SELECTING_ACTION
+    context.user_data['dyno_app_name'] = app.name
+    message_text = describe_dyno_panel(app.name, status)
+    if notice:
+        message_text = f"{notice}\n\n{message_text}"
+    await query.edit_message_text(message_text, reply_markup=dyno_panel_markup(status), parse_mode='Markdown')
+    return MANAGING_DYNOS
 
-async def restart_selected_app(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def dyno_panel_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
-    app_id = query.data.split("app_")[1]
-    heroku_conn = get_heroku_conn()
+    if query.data.startswith("app_"):
+        context.user_data['dyno_app_id'] = query.data.split("app_")[1]
+    return await show_dyno_panel(update, context)
+
+def kill_dyno(heroku_conn, app_id, dyno_name):
+    # Heroku replaces a stopped formation dyno right away, so this restarts it.
+    r = heroku_conn._session.delete(heroku_conn._url_for("apps", app_id, "dynos", dyno_name))
+    r.raise_for_status()
+
+async def restart_one_dyno(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    dyno_name = query.data[len("dyno_rone_"):]
+    app_id = context.user_data.get('dyno_app_id')
+    try:
+        heroku_conn = await heroku_gateway.run(get_heroku_conn)
+        await heroku_gateway.run(kill_dyno, heroku_conn, app_id, dyno_name)
+        dyno_status.invalidate(app_id)
+        notice = f"🔄 Restarting `{dyno_name}`."
+    except Exception as e:
+        logger.error(f"Error restarting dyno {dyno_name} for app {app_id}: {e}")
+        notice = f"An error occurred while restarting `{dyno_name}`."
+    return await show_dyno_panel(update, context, notice=notice)
+
+rolling_restarts = set()
+
+async def start_rolling_restart(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    process_type = query.data[len("dyno_rtype_"):] if query.data.startswith("dyno_rtype_") else None
+    app_id = context.user_data.get('dyno_app_id')
+    app_name = context.user_data.get('dyno_app_name', app_id)
+    if app_id in rolling_restarts:
+        return await show_dyno_panel(update, context, notice="A rolling restart is already running for this app.")
+    try:
+        heroku_conn = await heroku_gateway.run(get_heroku_conn)
+        dyno_status.invalidate(app_id)
+        status = await dyno_status.get(heroku_conn, app_id)
+    except Exception as e:
+        logger.error(f"Error fetching dynos for app {app_id}: {e}")
+        return await show_dyno_panel(update, context, notice="An error occurred while fetching the dynos.")
+    names = [
+        d["name"] for d in sorted(status["dynos"], key=dyno_sort_key)
+        if d["type"] != "run" and (process_type is None or d["type"] == process_type)
+    ]
+    if not names:
+        return await show_dyno_panel(update, context, notice="There are no dynos to restart.")
+    rolling_restarts.add(app_id)
+    progress_message = await context.bot.send_message(
+        chat_id=query.message.chat_id, text=f"Rolling restart of {len(names)} dyno(s) for {app_name}..."
+    )
+    context.application.create_task(run_rolling_restart(context, progress_message, app_id, app_name, names))
+    return await show_dyno_panel(
+        update, context, notice=f"Rolling restart of {len(names)} dyno(s) started, one at a time once the previous one is up."
+    )
+
+async def wait_for_dyno_up(heroku_conn, app_id, name):
+    # A killed dyno keeps its name and comes back as starting, then up. Heroku
+    # can still list it as up right after the kill, so the stagger is waited
+    # out before the first look.
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max(DYNO_RESTART_TIMEOUT, DYNO_RESTART_STAGGER)
+    await asyncio.sleep(DYNO_RESTART_STAGGER)
+    while True:
+        status = await dyno_status.get(heroku_conn, app_id, max_age=0)
+        state = next((d["state"] for d in status["dynos"] if d["name"] == name), None)
+        if state == "up":
+            return True
+        if state == "crashed" or loop.time() >= deadline:
+            return False
+        await asyncio.sleep(DYNO_RESTART_POLL_INTERVAL)
+
+async def run_rolling_restart(context: ContextTypes.DEFAULT_TYPE, progress_message, app_id, app_name, names) -> None:
+    progress = ThrottledProgress(context.bot, progress_message.chat_id, progress_message.message_id, FANOUT_PROGRESS_INTERVAL)
+    failures = {}
+    stalled = None
+    done = 0
+    try:
+        for index, name in enumerate(names, 1):
+            done = index
+            try:
+                heroku_conn = await heroku_gateway.run(get_heroku_conn)
+                await heroku_gateway.run(kill_dyno, heroku_conn, app_id, name)
+            except Exception as e:
+                logger.error(f"Rolling restart of dyno {name} for app {app_name} failed: {e}")
+                failures[name] = e
+                continue
+            finally:
+                dyno_status.invalidate(app_id)
+            await progress.update(f"Rolling restart of `{app_name}`: {index}/{len(names)} dyno(s) restarted, waiting for `{name}` to come up...")
+            if index == len(names):
+                break
+            try:
+                up = await wait_for_dyno_up(heroku_conn, app_id, name)
+            except Exception as e:
+                logger.error(f"Could not check dyno {name} for app {app_name}: {e}")
+                up = False
+            if not up:
+                # Restarting more dynos while this one is down could take the app down.
+                stalled = name
+                break
+    finally:
+        rolling_restarts.discard(app_id)
+    summary = f"Rolling restart of `{app_name}`: restarted {done - len(failures)}/{len(names)} dyno(s)."
+    if stalled:
+        summary += (
+            f"\n\nStopped because `{stalled}` was not up after {max(DYNO_RESTART_TIMEOUT, DYNO_RESTART_STAGGER):g}s; "
+            f"{len(names) - done} dyno(s) were not restarted."
+        )
+    if failures:
+        summary += "\n\nFailed:\n" + "\n".join(f"- `{name}`: {escape_markdown(str(error))}" for name, error in failures.items())
+    await progress.update(summary, force=True)
+
+async def ask_dyno_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE, action: dict, question: str) -> int:
+    context.user_data['dyno_action'] = action
+    keyboard = [
+        [
+            InlineKeyboardButton("✅ Confirm", callback_data="dyno_confirm"),
+            InlineKeyboardButton("❌ Cancel", callback_data="dyno_back"),
+        ]
+    ]
+    await update.callback_query.edit_message_text(question, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+    return CONFIRM_DYNO_ACTION
+
+async def dyno_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.callback_query.answer()
+    action = context.user_data.pop('dyno_action', None)
+    if action is None:
+        return await show_dyno_panel(update, context, notice="Nothing to confirm any more. Please try again.")
+    if action['type'] == 'restart_all':
+        return await restart_all_dynos(update, context)
+    return await apply_scale(update, context, action['kind'], action['value'], action['process_type'])
+
+async def confirm_restart_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.callback_query.answer()
+    app_name = context.user_data.get('dyno_app_name', context.user_data.get('dyno_app_id'))
+    return await ask_dyno_confirmation(
+        update, context, {'type': 'restart_all'},
+        f"Are you sure you want to restart every dyno of `{app_name}` at once?\n"
+        "The app is unavailable until they are back up. A rolling restart avoids that."
+    )
+
+async def restart_all_dynos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    app_id = context.user_data.get('dyno_app_id')
+    heroku_conn = await heroku_gateway.run(get_heroku_conn)
     if not heroku_conn:
         await query.edit_message_text("Error: Heroku connection failed.")
         return ConversationHandler.END
     try:
-        app = heroku_conn.app(app_id)
-        await query.edit_message_text(f"Restarting all dynos for `{app.name}`...", parse_mode='Markdown')
-        app.restart()
-        await query.edit_message_text(f"✅ Successfully restarted all dynos for `{app.name}`.", parse_mode='Markdown')
+        app = await get_app(heroku_conn, app_id)
+        await query.edit_message_text(f"Restarting all dynos for `{app.name}`...", parse_mode='Markdown')
+        await heroku_gateway.run(app.restart)
+        app_catalog.invalidate()
+        dyno_status.invalidate(app.id)
+        notice = f"✅ Successfully restarted all dynos for `{app.name}`."
+    except Exception as e:
+        logger.error(f"Error restarting dynos for app {app_id}: {e}")
+        notice = "An error occurred while restarting the dynos."
+    return await show_dyno_panel(update, context, notice=notice)
+
+async def show_scale_options(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    process_type = query.data[len("dyno_scale_"):]
+    app_id = context.user_data.get('dyno_app_id')
+    try:
+        heroku_conn = await heroku_gateway.run(get_heroku_conn)
+        status = await dyno_status.get(heroku_conn, app_id)
+    except Exception as e:
+        logger.error(f"Error fetching formation for app {app_id}: {e}")
+        return await show_dyno_panel(update, context, notice="An error occurred while fetching the formation.")
+    formation = next((f for f in status["formation"] if f["type"] == process_type), None)
+    if formation is None:
+        return await show_dyno_panel(update, context, notice=f"`{process_type}` is no longer part of the formation.")
+    quantity = formation["quantity"]
+    context.user_data['dyno_scale_from'] = {process_type: quantity}
+    quantities = sorted({0, 1, 2, 3, 5, 10, max(quantity - 1, 0), quantity + 1} - {quantity})
+    quantity_buttons = [InlineKeyboardButton(str(q), callback_data=f"dyno_qty_{q}_{process_type}") for q in quantities]
+    size_buttons = [
+        InlineKeyboardButton(size, callback_data=f"dyno_size_{size}_{process_type}")
+        for size in DYNO_SIZES if size.lower() != formation["size"].lower()
+    ]
+    keyboard = [quantity_buttons[i:i + 4] for i in range(0, len(quantity_buttons), 4)]
+    keyboard += [size_buttons[i:i + 3] for i in range(0, len(size_buttons), 3)]
+    keyboard.append([InlineKeyboardButton("⬅️ Back to Dynos", callback_data="dyno_back")])
+    await query.edit_message_text(
+        f"`{process_type}` runs {quantity} × {formation['size']}.\n"
+        "Pick a new number of dynos (first rows) or a new dyno size (last rows).",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode='Markdown'
+    )
+    return SCALING_DYNOS
+
+def is_risky_scale(process_type, quantity, current):
+    # Zero stops the process type; fewer web dynos leave less room for live traffic.
+    return quantity == 0 or (process_type == "web" and (current is None or quantity < current))
+
+async def scale_dynos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    _, kind, value, process_type = query.data.split("_", 3)
+    current = context.user_data.get('dyno_scale_from', {}).get(process_type)
+    if kind == "qty" and is_risky_scale(process_type, int(value), current):
+        if int(value) == 0:
+            question = f"Are you sure you want to scale `{process_type}` to 0 dynos?\nIt stops running until it is scaled up again."
+        else:
+            question = f"Are you sure you want to scale `web` down to {value} dyno(s)?\nLess capacity is left for live traffic."
+        action = {'type': 'scale', 'kind': kind, 'value': value, 'process_type': process_type}
+        return await ask_dyno_confirmation(update, context, action, question)
+    return await apply_scale(update, context, kind, value, process_type)
+
+async def apply_scale(update: Update, context: ContextTypes.DEFAULT_TYPE, kind: str, value: str, process_type: str) -> int:
+    app_id = context.user_data.get('dyno_app_id')
+    try:
+        heroku_conn = await heroku_gateway.run(get_heroku_conn)
+        app = await get_app(heroku_conn, app_id)
+        if kind == "qty":
+            await heroku_gateway.run(app.scale_formation_process, process_type, int(value))
+            notice = f"⚖️ Scaled `{process_type}` to {value} dyno(s)."
+        else:
+            # The batch endpoint answers with a list, which is what heroku3 expects here.
+            await heroku_gateway.run(app.batch_resize_formation_processes, {process_type: value})
+            notice = f"⚖️ Resized `{process_type}` dynos to {value}."
+        dyno_status.invalidate(app.id)
     except Exception as e:
-        logger.error(f"Error restarting dynos for app {app_id}: {e}")
-        await query.edit_message_text("An error occurred while restarting the dynos.")
-    await show_main_menu(update, context)
-    return SELECTING_ACTION
+        logger.error(f"Error scaling {process_type} for app {app_id}: {e}")
+        notice = f"An error occurred while scaling `{process_type}`."
+    return await show_dyno_panel(update, context, notice=notice)
 
 async def view_logs_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return await ask_for_app_selection(update, context, SELECTING_APP_FOR_LOGS, "view logs for")
 
-async def show_logs_for_selected_app(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+def log_actions_markup():
+    keyboard = [
+        [InlineKeyboardButton(f"{lines} lines", callback_data=f"log_lines_{lines}") for lines in LOG_LINE_CHOICES],
+        [InlineKeyboardButton("▶️ Follow Logs", callback_data="follow_logs")],
+        [InlineKeyboardButton("⬅️ Back to Menu", callback_data="main_menu")],
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+async def deliver_logs(update: Update, context: ContextTypes.DEFAULT_TYPE, lines: int) -> int:
     query = update.callback_query
-    await query.answer()
-    app_id = query.data.split("app_")[1]
-    heroku_conn = get_heroku_conn()
+    chat_id = query.message.chat_id
+    app_id = context.user_data.get('log_app_id')
+    if not app_id:
+        await query.edit_message_text("Error: Session expired. Please start over.")
+        return ConversationHandler.END
+    heroku_conn = await heroku_gateway.run(get_heroku_conn)
     if not heroku_conn:
         await query.edit_message_text("Error: Heroku connection failed.")
         return ConversationHandler.END
+    reply_markup = log_actions_markup()
     try:
-        app = heroku_conn.app(app_id)
-        await query.edit_message_text(f"Fetching logs for `{app.name}`...", parse_mode='Markdown')
-        logs = app.get_log(lines=100)
+        app = await get_app(heroku_conn, app_id)
+        await query.edit_message_text(f"Fetching the last {lines} log lines for `{app.name}`...", parse_mode='Markdown')
+        logs = await heroku_gateway.run(app.get_log, lines=lines)
+        header = f"Logs for `{app.name}` (last {lines} lines):"
         if not logs:
-            log_message = f"No logs found for `{app.name}`."
-        else:
-            log_message = f"Logs for `{app.name}`:\n\n```\n{logs}\n```"
-        if len(log_message) > 4096:
-            await query.edit_message_text(f"Logs for `{app.name}` are too long. Sending the last 4000 characters.", parse_mode='Markdown')
-            await context.bot.send_message(chat_id=query.message.chat_id, text=f"```\n{logs[-4000:]}\n```", parse_mode='Markdown')
+            await query.edit_message_text(f"No logs found for `{app.name}`.", reply_markup=reply_markup, parse_mode='Markdown')
+        elif len(logs) + len(header) + 10 <= TELEGRAM_MESSAGE_LIMIT:
+            try:
+                await query.edit_message_text(f"{header}\n\n```\n{logs}\n```", reply_markup=reply_markup, parse_mode='Markdown')
+            except BadRequest:
+                # Log lines can contain backticks that break the Markdown block.
+                await query.edit_message_text(f"Logs for {app.name} (last {lines} lines):\n\n{logs}", reply_markup=reply_markup)
+        elif len(logs) <= LOG_DOCUMENT_THRESHOLD:
+            await query.edit_message_text(header, parse_mode='Markdown')
+            for chunk in chunk_log_lines(logs.splitlines(), TELEGRAM_MESSAGE_LIMIT - 8):
+                await send_log_chunk(context.bot, chat_id, chunk)
+            # The buttons go on a message of their own: the next tap edits the
+            # message it sits on, which must not be one of the log chunks.
+            await context.bot.send_message(chat_id=chat_id, text="Fetch more lines or follow live:", reply_markup=reply_markup)
         else:
-             await query.edit_message_text(log_message, parse_mode='Markdown')
+            await query.edit_message_text(f"{header}\nSending them as a file.", parse_mode='Markdown')
+            await context.bot.send_document(chat_id=chat_id, document=build_log_document(app.name, logs, LOG_GZIP))
+            await context.bot.send_message(chat_id=chat_id, text="Fetch more lines or follow live:", reply_markup=reply_markup)
     except Exception as e:
         logger.error(f"Error fetching logs for app {app_id}: {e}")
         await query.edit_message_text("An error occurred while fetching the logs.")
+        await show_main_menu(update, context)
+        return SELECTING_ACTION
+    return SELECTING_LOG_ACTION
+
+async def show_logs_for_selected_app(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    context.user_data['log_app_id'] = query.data.split("app_")[1]
+    return await deliver_logs(update, context, LOG_LINE_CHOICES[0])
+
+async def log_lines_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    return await deliver_logs(update, context, int(query.data.split("_")[-1]))
+
+async def follow_logs(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    chat_id = query.message.chat_id
+    app_id = context.user_data.get('log_app_id')
+    if not app_id:
+        await query.edit_message_text("Error: Session expired. Please start over.")
+        return ConversationHandler.END
+    await stop_log_follower(chat_id)
+    if len(log_followers) >= LOG_MAX_FOLLOWERS:
+        await context.bot.send_message(chat_id=chat_id, text="Too many log streams are open right now. Please try again later.")
+        return SELECTING_LOG_ACTION
+    heroku_conn = await heroku_gateway.run(get_heroku_conn)
+    if not heroku_conn:
+        await context.bot.send_message(chat_id=chat_id, text="Error: Heroku connection failed.")
+        return SELECTING_LOG_ACTION
+    try:
+        app = await get_app(heroku_conn, app_id)
+        logplex_url = await heroku_gateway.run(create_log_session, heroku_conn, app.id, 10, True)
+        keyboard = [[InlineKeyboardButton("⏹ Stop", callback_data="stop_follow_logs")]]
+        status = await context.bot.send_message(
+            chat_id=chat_id,
+            text=f"📡 Following logs for `{app.name}`. New lines are posted every few seconds.",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown',
+        )
+    except Exception as e:
+        logger.error(f"Error opening log stream for app {app_id}: {e}")
+        await context.bot.send_message(chat_id=chat_id, text="An error occurred while opening the log stream.")
+        return SELECTING_LOG_ACTION
+    follower = LogFollower(context.bot, chat_id, status.message_id, app.name, logplex_url)
+    log_followers[chat_id] = follower
+    follower.start()
+    return FOLLOWING_LOGS
+
+async def stop_follow_logs(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    await stop_log_follower(query.message.chat_id)
     await show_main_menu(update, context)
     return SELECTING_ACTION
 
 async def manage_envs_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return await ask_for_app_selection(update, context, SELECTING_APP_FOR_ENV, "manage environment variables for")
 
-async def show_env_options(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 0) -> int:
+def is_sensitive_env_key(key):
+    return any(s in key.upper() for s in ['KEY', 'TOKEN', 'SECRET', 'PASSWORD'])
+
+def display_env_value(key, value):
+    return '********' if is_sensitive_env_key(key) else value
+
+async def show_env_options(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int = 0, notice: str = None) -> int:
     query = update.callback_query
     if query:
         await query.answer()
     
-    if 'env_vars' not in context.user_data:
-        app_id = context.user_data.get('selected_app_id')
-        
-        if not app_id and query:
-            try:
-                app_id = query.data.split("app_")[1]
-                context.user_data['selected_app_id'] = app_id
-            except IndexError:
-                await query.edit_message_text("Error: Could not determine the application. Please go back and try again.")
-                return SELECTING_ACTION
-        elif not app_id and not query:
-             await update.message.reply_text("Error: Session expired. Please start over.")
-             return ConversationHandler.END
-
-        heroku_conn = get_heroku_conn()
-        if not heroku_conn:
-            await query.edit_message_text("Error: Heroku connection failed.")
-            return ConversationHandler.END
+    reply = query.edit_message_text if query else update.message.reply_text
+    app_id = context.user_data.get('selected_app_id')
+    if not app_id and query:
         try:
-            app = heroku_conn.app(app_id)
-            context.user_data['app_name'] = app.name
-            config = app.config()
-            context.user_data['env_vars'] = sorted(config.to_dict().items())
-        except Exception as e:
-            logger.error(f"Error fetching ENVs for app {app_id}: {e}")
-            await query.edit_message_text("An error occurred while fetching ENVs.")
+            app_id = query.data.split("app_")[1]
+            context.user_data['selected_app_id'] = app_id
+        except IndexError:
+            await query.edit_message_text("Error: Could not determine the application. Please go back and try again.")
             return SELECTING_ACTION
+    elif not app_id and not query:
+         await update.message.reply_text("Error: Session expired. Please start over.")
+         return ConversationHandler.END
+
+    heroku_conn = await heroku_gateway.run(get_heroku_conn)
+    if not heroku_conn:
+        await reply("Error: Heroku connection failed.")
+        return ConversationHandler.END
+    try:
+        app = await get_app(heroku_conn, app_id)
+        context.user_data['app_name'] = app.name
+        snapshot = await config_cache.get(heroku_conn, app.id)
+    except Exception as e:
+        logger.error(f"Error fetching ENVs for app {app_id}: {e}")
+        await reply("An error occurred while fetching ENVs.")
+        return SELECTING_ACTION
 
-    env_vars = context.user_data['env_vars']
     app_name = context.user_data['app_name']
+    changes = context.user_data.get('env_changes', {})
     
     start_index = page * ENVS_PER_PAGE
     end_index = start_index + ENVS_PER_PAGE
-    paginated_vars = env_vars[start_index:end_index]
+    paginated_vars = snapshot.page(start_index, end_index)
 
     keyboard = []
     if paginated_vars:
         for key, value in paginated_vars:
-            display_value = '********' if any(s in key.upper() for s in ['KEY', 'TOKEN', 'SECRET', 'PASSWORD']) else value
+            if key in changes:
+                display_value = "🗑 (delete)" if changes[key] is None else f"✏️ {display_env_value(key, changes[key])}"
+            else:
+                display_value = display_env_value(key, value)
             keyboard.append([
                 InlineKeyboardButton(f"{key}", callback_data="noop"),
                 InlineKeyboardButton(f"{display_value}", callback_data=f"update_env_{key}")
@@ -252,7 +2300,7 @@ async def show_env_options(update: Update, context: ContextTypes.DEFAULT_TYPE, p
     nav_buttons = []
     if page > 0:
         nav_buttons.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"env_page_{page - 1}"))
-    if end_index < len(env_vars):
+    if end_index < len(snapshot.keys):
         nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"env_page_{page + 1}"))
     
     if nav_buttons:
@@ -262,17 +2310,23 @@ async def show_env_options(update: Update, context: ContextTypes.DEFAULT_TYPE, p
         InlineKeyboardButton("➕ Add New", callback_data="add_env"),
         InlineKeyboardButton("➖ Delete", callback_data="delete_env"),
     ])
+    keyboard.append([
+        InlineKeyboardButton("📥 Import", callback_data="import_env"),
+        InlineKeyboardButton("📤 Export", callback_data="export_env"),
+    ])
+    if changes:
+        keyboard.append([InlineKeyboardButton(f"📝 Review {len(changes)} Change(s)", callback_data="review_env_changes")])
     keyboard.append([InlineKeyboardButton("⬅️ Back to Menu", callback_data="main_menu")])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
-    total_pages = (len(env_vars) + ENVS_PER_PAGE - 1) // ENVS_PER_PAGE or 1
+    total_pages = (len(snapshot.keys) + ENVS_PER_PAGE - 1) // ENVS_PER_PAGE or 1
     message_text = f"Tap on a value to update it.\nENVs for `{app_name}` (Page {page + 1}/{total_pages}):"
+    if changes:
+        message_text = f"{len(changes)} staged change(s) will be applied together when you commit them.\n{message_text}"
+    if notice:
+        message_text = f"{notice}\n\n{message_text}"
 
-    if query:
-        await query.edit_message_text(message_text, reply_markup=reply_markup, parse_mode='Markdown')
-    else:
-        await update.message.reply_text(message_text, reply_markup=reply_markup, parse_mode='Markdown')
-    
+    await reply(message_text, reply_markup=reply_markup, parse_mode='Markdown')
     return SELECTING_ENV_ACTION
 
 async def env_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -291,48 +2345,32 @@ async def start_env_update_flow(update: Update, context: ContextTypes.DEFAULT_TY
     await query.edit_message_text(f"Please send the new value for `{key_to_update}`.", parse_mode='Markdown')
     return AWAITING_NEW_VALUE
 
-async def get_new_value_and_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    new_value = update.message.text
-    key_to_update = context.user_data.get('key_to_update')
-    context.user_data['new_value'] = new_value
-    keyboard = [
-        [
-            InlineKeyboardButton("✅ Confirm", callback_data="confirm_update"),
-            InlineKeyboardButton("❌ Cancel", callback_data="cancel_update"),
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text(
-        f"Are you sure you want to set `{key_to_update}` to this new value?\n\n`{new_value}`",
-        reply_markup=reply_markup,
-        parse_mode='Markdown'
-    )
-    return CONFIRM_UPDATE
+async def current_env_values(context: ContextTypes.DEFAULT_TYPE) -> dict:
+    app_id = context.user_data.get('selected_app_id')
+    snapshot = config_cache.peek(app_id)
+    if snapshot is None and app_id:
+        # Staged changes can outlive the cached snapshot, e.g. across a restart.
+        try:
+            heroku_conn = await heroku_gateway.run(get_heroku_conn)
+            snapshot = await config_cache.get(heroku_conn, app_id)
+        except Exception as e:
+            logger.warning(f"Could not load ENVs for app {app_id}: {e}")
+    return snapshot.values if snapshot else {}
 
-async def process_env_update_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query = update.callback_query
-    await query.answer()
-    if query.data == "cancel_update":
-        await query.edit_message_text("Update cancelled.")
-        context.user_data.pop('env_vars', None)
-        return await show_env_options(update, context)
+async def stage_env_change(context: ContextTypes.DEFAULT_TYPE, key: str, value) -> None:
+    changes = context.user_data.setdefault('env_changes', {})
+    current = await current_env_values(context)
+    if value is None and key not in current:
+        changes.pop(key, None)
+    elif value is not None and current.get(key) == value:
+        changes.pop(key, None)
+    else:
+        changes[key] = value
 
-    app_id = context.user_data['selected_app_id']
-    key = context.user_data['key_to_update']
-    new_value = context.user_data['new_value']
-    heroku_conn = get_heroku_conn()
-    try:
-        app = heroku_conn.app(app_id)
-        await query.edit_message_text(f"Updating `{key}` for `{app.name}`...", parse_mode='Markdown')
-        config = app.config()
-        config[key] = new_value
-        await query.edit_message_text(f"✅ Successfully updated `{key}`. Refreshing list...")
-    except Exception as e:
-        logger.error(f"Error updating ENV for app {app_id}: {e}")
-        await query.edit_message_text("An error occurred while updating the ENV.")
-    
-    context.user_data.pop('env_vars', None)
-    return await show_env_options(update, context)
+async def get_new_value_and_stage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    key_to_update = context.user_data.get('key_to_update')
+    await stage_env_change(context, key_to_update, update.message.text)
+    return await show_env_options(update, context, notice=f"Staged a new value for `{key_to_update}`.")
 
 async def add_env_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
@@ -345,23 +2383,10 @@ async def add_env_get_key(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await update.message.reply_text(f"OK. Now send the value for `{context.user_data['new_env_key']}`.")
     return ENTERING_ENV_VALUE_ADD
 
-async def add_env_get_value_and_set(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    new_env_value = update.message.text
+async def add_env_get_value_and_stage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     new_env_key = context.user_data['new_env_key']
-    app_id = context.user_data['selected_app_id']
-    heroku_conn = get_heroku_conn()
-    try:
-        app = heroku_conn.app(app_id)
-        await update.message.reply_text(f"Adding `{new_env_key}` to `{app.name}`...", parse_mode='Markdown')
-        config = app.config()
-        config[new_env_key] = new_env_value
-        await update.message.reply_text(f"✅ Successfully added `{new_env_key}`. Refreshing list...")
-    except Exception as e:
-        logger.error(f"Error adding ENV for app {app_id}: {e}")
-        await update.message.reply_text("An error occurred while adding the environment variable.")
-    
-    context.user_data.pop('env_vars', None)
-    return await show_env_options(update, context)
+    await stage_env_change(context, new_env_key, update.message.text)
+    return await show_env_options(update, context, notice=f"Staged `{new_env_key}` to be added.")
 
 async def delete_env_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
@@ -369,46 +2394,406 @@ async def delete_env_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     await query.edit_message_text("Please send the key of the environment variable you want to delete.")
     return ENTERING_ENV_KEY_DELETE
 
-async def delete_env_get_key_and_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def delete_env_get_key_and_stage(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     key_to_delete = update.message.text
-    context.user_data['key_to_delete'] = key_to_delete
-    app_name = context.user_data['app_name']
+    changes = context.user_data.get('env_changes', {})
+    if key_to_delete not in await current_env_values(context) and key_to_delete not in changes:
+        return await show_env_options(update, context, notice=f"Error: ENV var `{key_to_delete}` not found.")
+    await stage_env_change(context, key_to_delete, None)
+    return await show_env_options(update, context, notice=f"Staged `{key_to_delete}` to be deleted.")
+
+def describe_env_changes(current, changes):
+    lines = []
+    for key in sorted(changes):
+        value = changes[key]
+        if value is None:
+            lines.append(f"➖ `{key}`")
+        elif key in current:
+            lines.append(f"✏️ `{key}`: `{display_env_value(key, current[key])}` → `{display_env_value(key, value)}`")
+        else:
+            lines.append(f"➕ `{key}` = `{display_env_value(key, value)}`")
+    return "\n".join(lines)
+
+async def review_env_changes(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    changes = context.user_data.get('env_changes')
+    if not changes:
+        return await show_env_options(update, context)
+    if query:
+        await query.answer()
+    reply = query.edit_message_text if query else update.message.reply_text
     keyboard = [
         [
-            InlineKeyboardButton("Yes, Delete it", callback_data="confirm_delete"),
-            InlineKeyboardButton("No, Cancel", callback_data="cancel_delete"),
-        ]
+            InlineKeyboardButton("✅ Commit", callback_data="commit_env_changes"),
+            InlineKeyboardButton("🗑 Discard", callback_data="discard_env_changes"),
+        ],
+        [InlineKeyboardButton("⬅️ Back to ENVs", callback_data="back_to_envs")],
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text(f"Are you sure you want to delete `{key_to_delete}` from `{app_name}`?", reply_markup=reply_markup, parse_mode='Markdown')
-    return CONFIRM_ENV_DELETE
+    diff = describe_env_changes(await current_env_values(context), changes)
+    await reply(
+        f"Pending changes for `{context.user_data['app_name']}`:\n\n{diff}\n\nCommit applies them in a single release.",
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+    return REVIEWING_ENV_CHANGES
 
-async def process_delete_env_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def commit_env_changes(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
-    await query.answer()
-    if query.data == "cancel_delete":
-        await query.edit_message_text("Deletion cancelled.")
-        context.user_data.pop('env_vars', None)
+    changes = context.user_data.get('env_changes')
+    if not changes:
         return await show_env_options(update, context)
-    
-    key_to_delete = context.user_data['key_to_delete']
     app_id = context.user_data['selected_app_id']
-    heroku_conn = get_heroku_conn()
+    heroku_conn = await heroku_gateway.run(get_heroku_conn)
     try:
-        app = heroku_conn.app(app_id)
-        await query.edit_message_text(f"Deleting `{key_to_delete}` from `{app.name}`...", parse_mode='Markdown')
-        config = app.config()
-        del config[key_to_delete]
-        await query.edit_message_text(f"✅ Successfully deleted `{key_to_delete}`. Refreshing list...")
-    except KeyError:
-        await query.edit_message_text(f"Error: ENV var `{key_to_delete}` not found.")
+        app = await get_app(heroku_conn, app_id)
+        await query.edit_message_text(f"Applying {len(changes)} change(s) to `{app.name}`...", parse_mode='Markdown')
+        config = await heroku_gateway.run(app.update_config, changes)
+        app_catalog.invalidate()
+        config_cache.replace(app.id, config.to_dict())
+        context.user_data.pop('env_changes', None)
+        notice = f"✅ Successfully applied {len(changes)} change(s)."
     except Exception as e:
-        logger.error(f"Error deleting ENV for app {app_id}: {e}")
-        await query.edit_message_text("An error occurred while deleting the ENV.")
-    
-    context.user_data.pop('env_vars', None)
+        logger.error(f"Error applying ENV changes for app {app_id}: {e}")
+        notice = "An error occurred while applying the changes. They are still staged."
+    return await show_env_options(update, context, notice=notice)
+
+async def discard_env_changes(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    context.user_data.pop('env_changes', None)
+    return await show_env_options(update, context, notice="Discarded all staged changes.")
+
+async def back_to_env_options(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return await show_env_options(update, context)
 
+def parse_dotenv_lines(lines):
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("export "):
+            line = line[len("export "):].lstrip()
+        key, sep, value = line.partition("=")
+        if not sep:
+            yield number, None, f"line {number}: expected KEY=VALUE"
+            continue
+        value = value.strip()
+        quoted = re.match(r"""(?:"((?:\\.|[^"\\])*)"|'([^']*)')\s*(?:#.*)?$""", value)
+        if quoted:
+            double, single = quoted.groups()
+            value = single
+            if double is not None:
+                value = re.sub(r"\\(.)", lambda m: "\n" if m.group(1) == "n" else m.group(1), double)
+        else:
+            # An unquoted value ends where a whitespace-led comment starts.
+            value = re.sub(r"\s+#.*$", "", value)
+        yield number, key.strip(), value
+
+def parse_env_document(stream, filename):
+    # Returns ({key: value or None}, [errors]); the document is read line by
+    # line from the in-memory download rather than decoded in one piece.
+    # utf-8-sig drops the byte order mark some editors write.
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="strict")
+    changes, errors = {}, []
+    if filename.lower().endswith(".json"):
+        try:
+            data = json.load(text)
+        except ValueError as e:
+            return {}, [f"invalid JSON: {e}"]
+        if not isinstance(data, dict):
+            return {}, ["the JSON document must be an object of KEY: value pairs"]
+        entries = ((None, key, value) for key, value in data.items())
+    else:
+        entries = parse_dotenv_lines(text)
+    for number, key, value in entries:
+        where = f"line {number}" if number else f"key {key!r}"
+        if key is None:
+            errors.append(value)
+        elif not ENV_KEY_PATTERN.match(key):
+            errors.append(f"{where}: invalid key {key!r}")
+        elif value is not None and not isinstance(value, (str, int, float, bool)):
+            errors.append(f"{where}: value must be a string or null")
+        else:
+            changes[key] = value if value is None or isinstance(value, str) else json.dumps(value)
+    return changes, errors
+
+def format_dotenv(env_vars):
+    lines = []
+    for key, value in env_vars:
+        if value and re.search(r"[\s#'\"\\]", value):
+            value = '"' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        lines.append(f"{key}={value}")
+    return "\n".join(lines) + "\n"
+
+async def import_env_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    keyboard = [[InlineKeyboardButton("⬅️ Back to ENVs", callback_data="back_to_envs")]]
+    await query.edit_message_text(
+        "Please send a `.env` or `.json` file. Its variables will be staged for review before anything is applied.",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode='Markdown'
+    )
+    return AWAITING_ENV_FILE
+
+async def import_env_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    document = update.message.document
+    if document.file_size and document.file_size > ENV_IMPORT_MAX_BYTES:
+        await update.message.reply_text(f"The file is too large. The limit is {ENV_IMPORT_MAX_BYTES // 1024} KB.")
+        return AWAITING_ENV_FILE
+    try:
+        telegram_file = await document.get_file()
+        buffer = io.BytesIO()
+        await telegram_file.download_to_memory(out=buffer)
+        buffer.seek(0)
+        changes, errors = parse_env_document(buffer, document.file_name or "")
+    except UnicodeDecodeError:
+        changes, errors = {}, ["the file is not valid UTF-8 text"]
+    except Exception as e:
+        logger.error(f"Error reading ENV import file: {e}")
+        await update.message.reply_text("An error occurred while reading the file.")
+        return AWAITING_ENV_FILE
+    if errors:
+        shown = "\n".join(errors[:10])
+        more = f"\n...and {len(errors) - 10} more" if len(errors) > 10 else ""
+        await update.message.reply_text(f"The file was not imported:\n{shown}{more}")
+        return AWAITING_ENV_FILE
+    for key, value in changes.items():
+        await stage_env_change(context, key, value)
+    if not context.user_data.get('env_changes'):
+        return await show_env_options(update, context, notice="The file matches the current config. Nothing to change.")
+    return await review_env_changes(update, context)
+
+async def export_env(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    app_name = context.user_data.get('app_name', 'app')
+    data = format_dotenv(sorted((await current_env_values(context)).items())).encode("utf-8")
+    await context.bot.send_document(
+        chat_id=query.message.chat_id,
+        document=InputFile(io.BytesIO(data), filename=f"{app_name}.env"),
+        caption=f"Config vars for {app_name}",
+    )
+    return SELECTING_ENV_ACTION
+
+async def bulk_actions_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.callback_query.answer()
+    context.user_data['bulk_selected'] = set()
+    context.user_data['app_picker'] = {
+        'next_state': SELECTING_APPS_FOR_BULK,
+        'action_text': "include in the bulk action (tap to toggle)",
+        'search': None,
+        'multi': True,
+    }
+    return await show_app_picker(update, context)
+
+async def toggle_bulk_app(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    app_id = query.data.split("app_")[1]
+    selected = context.user_data.setdefault('bulk_selected', set())
+    selected.symmetric_difference_update({app_id})
+    return await current_picker_page(update, context)
+
+async def bulk_select_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    picker = context.user_data.get('app_picker', {})
+    page = picker.get('page', 0)
+    page_ids = {app.id for app in picker_matches(picker)[page * APPS_PER_PAGE:(page + 1) * APPS_PER_PAGE]}
+    selected = context.user_data.setdefault('bulk_selected', set())
+    if page_ids <= selected:
+        selected.difference_update(page_ids)
+    else:
+        selected.update(page_ids)
+    return await current_picker_page(update, context)
+
+async def bulk_clear(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.callback_query.answer()
+    context.user_data['bulk_selected'] = set()
+    return await current_picker_page(update, context)
+
+async def bulk_continue(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    selected = context.user_data.get('bulk_selected')
+    if not selected:
+        await query.answer("Select at least one app first.", show_alert=True)
+        return SELECTING_APPS_FOR_BULK
+    await query.answer()
+    keyboard = [
+        [InlineKeyboardButton("🔄 Restart Dynos", callback_data="bulk_restart")],
+        [InlineKeyboardButton("✏️ Set an ENV", callback_data="bulk_set_env")],
+        [InlineKeyboardButton("⬅️ Back to Apps", callback_data="bulk_back_to_apps")],
+    ]
+    await query.edit_message_text(
+        f"What should be done on the {len(selected)} selected app(s)?", reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return SELECTING_BULK_ACTION
+
+async def bulk_back_to_apps(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.callback_query.answer()
+    return await current_picker_page(update, context)
+
+async def ask_bulk_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE, description: str) -> int:
+    query = update.callback_query
+    reply = query.edit_message_text if query else update.message.reply_text
+    keyboard = [
+        [
+            InlineKeyboardButton("✅ Confirm", callback_data="bulk_confirm"),
+            InlineKeyboardButton("❌ Cancel", callback_data="main_menu"),
+        ]
+    ]
+    count = len(context.user_data.get('bulk_selected', ()))
+    await reply(f"Are you sure you want to {description} on {count} app(s)?", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+    return CONFIRM_BULK_ACTION
+
+async def bulk_restart(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.callback_query.answer()
+    context.user_data['bulk_action'] = {'type': 'restart'}
+    return await ask_bulk_confirmation(update, context, "restart all dynos")
+
+async def bulk_set_env_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    await query.edit_message_text("Please send the key of the environment variable to set on every selected app.")
+    return ENTERING_BULK_ENV_KEY
+
+async def bulk_set_env_get_key(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    key = update.message.text.strip()
+    if not ENV_KEY_PATTERN.match(key):
+        await update.message.reply_text("That is not a valid key. Please send letters, digits and underscores only.")
+        return ENTERING_BULK_ENV_KEY
+    context.user_data['bulk_action'] = {'type': 'set_env', 'key': key}
+    await update.message.reply_text(f"OK. Now send the value for `{key}`.", parse_mode='Markdown')
+    return ENTERING_BULK_ENV_VALUE
+
+async def bulk_set_env_get_value(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    action = context.user_data['bulk_action']
+    action['value'] = update.message.text
+    return await ask_bulk_confirmation(
+        update, context, f"set `{action['key']}` to `{display_env_value(action['key'], action['value'])}`"
+    )
+
+async def bulk_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    await query.answer()
+    action = context.user_data.pop('bulk_action', None)
+    selected = context.user_data.pop('bulk_selected', set())
+    heroku_conn = await heroku_gateway.run(get_heroku_conn)
+    if not heroku_conn or not action:
+        await query.edit_message_text("Error: Heroku connection failed." if action else "Error: Session expired. Please start over.")
+        return ConversationHandler.END
+    try:
+        apps = [await get_app(heroku_conn, app_id) for app_id in selected]
+    except Exception as e:
+        logger.error(f"Error resolving apps for bulk action: {e}")
+        await query.edit_message_text("An error occurred while fetching your apps.")
+        return ConversationHandler.END
+    progress_message = await context.bot.send_message(chat_id=query.message.chat_id, text=f"Starting on {len(apps)} app(s)...")
+    context.application.create_task(run_bulk_action(context, progress_message, apps, action))
+    await show_main_menu(update, context)
+    return SELECTING_ACTION
+
+async def run_bulk_action(context: ContextTypes.DEFAULT_TYPE, progress_message, apps, action) -> None:
+    if action['type'] == 'restart':
+        title = "Restarting dynos"
+
+        async def operation(app):
+            await heroku_gateway.run(app.restart)
+    else:
+        title = f"Setting `{action['key']}`"
+
+        async def operation(app):
+            config = await heroku_gateway.run(app.update_config, {action['key']: action['value']})
+            config_cache.replace(app.id, config.to_dict())
+
+    progress = ThrottledProgress(context.bot, progress_message.chat_id, progress_message.message_id, FANOUT_PROGRESS_INTERVAL)
+
+    async def on_progress(done, total):
+        await progress.update(f"{title}: {done}/{total} app(s) done...")
+
+    results = await fan_out(apps, operation, on_progress)
+    app_catalog.invalidate()
+    failures = {name: error for name, error in results.items() if error is not None}
+    summary = f"{title}: finished on {len(results) - len(failures)}/{len(results)} app(s)."
+    if failures:
+        summary += "\n\nFailed:\n" + "\n".join(f"- `{name}`: {escape_markdown(str(error))}" for name, error in sorted(failures.items())[:20])
+        for name, error in failures.items():
+            logger.error(f"Bulk action failed for app {name}: {error}")
+    await progress.update(summary, force=True)
+
+def is_admin(user_id: int) -> bool:
+    # Only users listed in ADMIN_USER_IDS are admins; the bot password alone is not enough.
+    return user_id in ADMIN_USER_IDS
+
+def describe_latencies(name, label, limit=5):
+    lines = []
+    for labels, histogram in metrics.slowest(name, limit):
+        p = histogram.percentiles()
+        lines.append(f"- {labels.get(label, 'all')}: {p[50]}/{p[95]}/{p[99]} ms ({histogram.count})")
+    return "\n".join(lines) or "- no samples yet"
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("This command is only available to bot admins listed in ADMIN_USER_IDS.")
+        return
+    budget = heroku_rate_governor.stats()
+    gateway = heroku_gateway.stats()
+    connections = heroku_connections.stats()
+    catalog = app_catalog.stats()
+    configs = config_cache.stats()
+    dynos = dyno_status.stats()
+    updates = update_processor.stats()
+    persistence = context.application.persistence
+    reported = budget['reported_remaining'] if budget['reported_remaining'] is not None else "n/a"
+    text = (
+        "Heroku API budget:\n"
+        f"- Remaining (estimated): {budget['estimated_remaining']}/{budget['capacity']}\n"
+        f"- Last reported by Heroku: {reported}\n"
+        f"- Throttled requests: {budget['throttled']}, 429 responses: {budget['rate_limited']}\n\n"
+        "Heroku calls:\n"
+        f"- Queued: {gateway['queued']}, in flight: {gateway['in_flight']}\n"
+        f"- Completed: {gateway['completed']}, timed out: {gateway['timed_out']}\n"
+        f"- Handshakes: {connections['handshakes']} (avg {connections['avg_handshake_ms']} ms), "
+        f"requests: {connections['requests']}, reconnects: {connections['reconnects']}\n\n"
+        "App catalog:\n"
+        f"- Apps: {catalog['apps']}, hit ratio: {catalog['hit_ratio']:.0%} "
+        f"({catalog['hits']} hits, {catalog['misses']} misses), 304 pages: {catalog['not_modified_pages']}\n\n"
+        "ENV cache:\n"
+        f"- Apps: {configs['apps']}, hit ratio: {configs['hit_ratio']:.0%} "
+        f"({configs['hits']} fresh, {configs['stale_hits']} stale, {configs['misses']} misses), "
+        f"304s: {configs['not_modified']}, local updates: {configs['local_updates']}\n\n"
+        "Dyno status cache:\n"
+        f"- Apps: {dynos['apps']}, hit ratio: {dynos['hit_ratio']:.0%} "
+        f"({dynos['hits']} hits, {dynos['misses']} misses), 304s: {dynos['not_modified']}\n\n"
+        "Updates:\n"
+        f"- Processed: {updates['processed']}, running: {updates['running']}, active users: {updates['active_users']}\n"
+        f"- Queue wait p50/p95/p99: {updates['wait_ms'][50]}/{updates['wait_ms'][95]}/{updates['wait_ms'][99]} ms\n"
+        f"- Handling p50/p95/p99: {updates['handling_ms'][50]}/{updates['handling_ms'][95]}/{updates['handling_ms'][99]} ms"
+    )
+    if persistence:
+        saved = persistence.stats()
+        text += f"\n\nPersistence:\n- Batches written: {saved['writes']}, rows: {saved['rows_written']}, pending: {saved['pending']}"
+    if WATCH_APPS:
+        watcher = app_watcher.stats()
+        text += (
+            f"\n\nApp watcher:\n- Polls: {watcher['polls']}, alerts: {watcher['alerts']}, "
+            f"release 304s: {watcher['not_modified']}, errors: {watcher['errors']}"
+        )
+    errors = {
+        name: sum(metrics.errors(name).values())
+        for name in ("bot_handler_errors_total", "heroku_request_errors_total", "telegram_request_errors_total")
+    }
+    text += (
+        "\n\nSlowest handlers, p50/p95/p99:\n" + describe_latencies("bot_handler_seconds", "handler")
+        + "\n\nSlowest Heroku endpoints:\n" + describe_latencies("heroku_request_seconds", "endpoint")
+        + "\n\nSlowest Telegram methods:\n" + describe_latencies("telegram_request_seconds", "method")
+        + f"\n\nMessage edits: {context.bot.output_stats['sent']} sent, "
+        f"{context.bot.output_stats['skipped']} skipped as unchanged"
+        + f"\n\nErrors: handlers {errors['bot_handler_errors_total']}, "
+        f"Heroku {errors['heroku_request_errors_total']}, Telegram {errors['telegram_request_errors_total']}"
+    )
+    await update.message.reply_text(text)
+
 async def back_to_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
@@ -416,17 +2801,302 @@ async def back_to_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return SELECTING_ACTION
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await stop_log_follower(update.effective_chat.id)
     await update.message.reply_text("Operation cancelled.")
     if update.callback_query:
         await show_main_menu(update, context)
     return ConversationHandler.END
 
-def main() -> None:
-    if not all([TELEGRAM_BOT_TOKEN, HEROKU_AUTH_TOKEN, BOT_PASSWORD]):
-        logger.critical("FATAL: Missing required environment variables.")
-        return
+metrics.register_callback(
+    "bot_cache_hit_ratio", "gauge", "Share of lookups served from cache.",
+    lambda: [
+        ({"cache": "apps"}, app_catalog.stats()["hit_ratio"]),
+        ({"cache": "envs"}, config_cache.stats()["hit_ratio"]),
+        ({"cache": "dynos"}, dyno_status.stats()["hit_ratio"]),
+    ],
+)
+metrics.register_callback(
+    "bot_cache_lookups", "gauge", "Cache lookups since start, by cache and result.",
+    lambda: [
+        ({"cache": "apps", "result": "hit"}, app_catalog.stats()["hits"]),
+        ({"cache": "apps", "result": "miss"}, app_catalog.stats()["misses"]),
+        ({"cache": "envs", "result": "hit"}, config_cache.stats()["hits"]),
+        ({"cache": "envs", "result": "stale"}, config_cache.stats()["stale_hits"]),
+        ({"cache": "envs", "result": "miss"}, config_cache.stats()["misses"]),
+        ({"cache": "dynos", "result": "hit"}, dyno_status.stats()["hits"]),
+        ({"cache": "dynos", "result": "miss"}, dyno_status.stats()["misses"]),
+    ],
+)
+metrics.register_callback(
+    "heroku_rate_limit_remaining", "gauge", "Estimated Heroku API requests left in the current window.",
+    lambda: [({}, heroku_rate_governor.stats()["estimated_remaining"])],
+)
+metrics.register_callback(
+    "heroku_gateway_calls", "gauge", "Heroku calls waiting for or running on the gateway.",
+    lambda: [({"state": "queued"}, heroku_gateway.stats()["queued"]), ({"state": "in_flight"}, heroku_gateway.stats()["in_flight"])],
+)
+metrics.register_callback(
+    "bot_updates_running", "gauge", "Updates currently being handled.",
+    lambda: [({}, update_processor.running)],
+)
+
+
+class InstrumentedRequest(BaseRequest):
+    # Wraps the real Bot API transport to time every call by method.
+    def __init__(self, inner):
+        self._inner = inner
+
+    @property
+    def read_timeout(self):
+        return self._inner.read_timeout
+
+    async def initialize(self):
+        await self._inner.initialize()
+
+    async def shutdown(self):
+        await self._inner.shutdown()
 
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        api_method = "file" if "/file/bot" in url else url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await self._inner.do_request(url, method, request_data, **kwargs)
+        except Exception as e:
+            metrics.inc("telegram_request_errors_total", method=api_method, status=type(e).__name__)
+            raise
+        finally:
+            metrics.observe("telegram_request_seconds", time.perf_counter() - started, method=api_method)
+        if code >= 400:
+            metrics.inc("telegram_request_errors_total", method=api_method, status=code)
+        return code, payload
+
+
+class ChatPacingRateLimiter(AIORateLimiter):
+    # AIORateLimiter paces the bot as a whole and every group, but not private
+    # chats. This adds a bucket per private chat: up to chat_burst requests at
+    # once, then chat_rate per second.
+    def __init__(self, chat_rate, chat_burst, **kwargs):
+        super().__init__(**kwargs)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._chat_limiters = collections.OrderedDict()
+
+    def _chat_limiter(self, chat_id):
+        limiter = self._chat_limiters.get(chat_id)
+        if limiter is None:
+            limiter = self._chat_limiters[chat_id] = AsyncLimiter(self._chat_burst, self._chat_burst / self._chat_rate)
+        self._chat_limiters.move_to_end(chat_id)
+        while len(self._chat_limiters) > CHAT_LIMITERS_CACHE:
+            self._chat_limiters.popitem(last=False)
+        return limiter
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        if self._chat_rate and isinstance(chat_id, int) and chat_id > 0:
+            async with self._chat_limiter(chat_id):
+                return await super().process_request(callback, args, kwargs, endpoint, data, rate_limit_args)
+        return await super().process_request(callback, args, kwargs, endpoint, data, rate_limit_args)
+
+
+class DedupingBot(ExtBot):
+    # Output layer for message edits. An edit that would not change what the
+    # message already shows is dropped; every other edit is sent right away,
+    # so callers get its result or exception. Pacing is left to the rate limiter.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        with self._unfrozen():
+            self._rendered = collections.OrderedDict()
+            self.output_stats = collections.Counter()
+
+    @staticmethod
+    def _rendering(text, kwargs):
+        parse_mode = kwargs.get("parse_mode")
+        return text, parse_mode if isinstance(parse_mode, str) else None, kwargs.get("reply_markup")
+
+    def _remember(self, key, rendering):
+        self._rendered[key] = rendering
+        self._rendered.move_to_end(key)
+        while len(self._rendered) > RENDERED_MESSAGES_CACHE:
+            self._rendered.popitem(last=False)
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        message = await super().send_message(chat_id, text, *args, **kwargs)
+        if not args:
+            self._remember((message.chat_id, message.message_id), self._rendering(text, kwargs))
+        return message
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, inline_message_id=None, **kwargs):
+        if chat_id is None or message_id is None:
+            return await super().edit_message_text(text, chat_id, message_id, inline_message_id, **kwargs)
+        key = (chat_id, message_id)
+        rendering = self._rendering(text, kwargs)
+        if self._rendered.get(key) == rendering:
+            self.output_stats["skipped"] += 1
+            return True
+        try:
+            result = await super().edit_message_text(text, chat_id=chat_id, message_id=message_id, **kwargs)
+            self.output_stats["sent"] += 1
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+            self.output_stats["skipped"] += 1
+            result = True
+        self._remember(key, rendering)
+        return result
+
+
+def instrument_handlers(handlers):
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            instrument_handlers(handler.entry_points)
+            instrument_handlers(handler.fallbacks)
+            for state_handlers in handler.states.values():
+                instrument_handlers(state_handlers)
+            continue
+        callback = handler.callback
+        if hasattr(callback, "__wrapped__"):
+            continue
+        name = callback.__name__
+        latency = metrics.histogram("bot_handler_seconds", handler=name)
+
+        @functools.wraps(callback)
+        async def timed(update, context, callback=callback, name=name, latency=latency):
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            except Exception:
+                metrics.inc("bot_handler_errors_total", handler=name)
+                raise
+            finally:
+                latency.record(time.perf_counter() - started)
+
+        handler.callback = timed
+
+
+metrics_server = None
+
+async def start_metrics_server(application: Application) -> None:
+    global metrics_server
+    metrics_server = MetricsServer(WEBHOOK_LISTEN, METRICS_PORT)
+    await metrics_server.start()
+
+async def stop_log_followers(application: Application) -> None:
+    # Runs as post_stop, while the bot can still send the lines a follower has buffered.
+    for chat_id in list(log_followers):
+        try:
+            await stop_log_follower(chat_id)
+        except Exception as e:
+            logger.warning(f"Could not stop following logs in chat {chat_id}: {e}")
+
+async def shutdown_gateway(application: Application) -> None:
+    try:
+        if metrics_server:
+            await metrics_server.stop()
+        await stop_log_followers(application)
+    finally:
+        heroku_gateway.shutdown()
+
+class MetricsServer:
+    # Small HTTP/1.0 server on plain asyncio streams for GET /metrics and
+    # /healthz. Scrapes are infrequent, so every response closes the connection.
+    def __init__(self, listen, port):
+        self.listen = listen
+        self.port = port
+        self.routes = {"/healthz": self._healthz, "/metrics": self._metrics}
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.listen, self.port)
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _healthz(self, headers):
+        return 200, "text/plain", b"ok"
+
+    async def _metrics(self, headers):
+        if METRICS_TOKEN and not hmac.compare_digest(headers.get("authorization", "").encode(), f"Bearer {METRICS_TOKEN}".encode()):
+            return 403, "text/plain", b"forbidden"
+        return 200, "text/plain; version=0.0.4", metrics.render().encode()
+
+    async def _serve(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(self._read_request(reader), METRICS_READ_TIMEOUT)
+            if request is None:
+                status, content_type, payload = 400, "text/plain", b"bad request"
+            else:
+                method, path, headers = request
+                if path not in self.routes:
+                    status, content_type, payload = 404, "text/plain", b"not found"
+                elif method != "GET":
+                    status, content_type, payload = 405, "text/plain", b"method not allowed"
+                else:
+                    status, content_type, payload = await self.routes[path](headers)
+            writer.write(
+                f"HTTP/1.0 {status} {HTTP_REASONS.get(status, 'OK')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+        except ValueError:
+            return None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return method, target.split("?", 1)[0], headers
+
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+def build_application() -> Application:
+    endpoints = {}
+    if TELEGRAM_API_BASE_URL:
+        endpoints = {"base_url": f"{TELEGRAM_API_BASE_URL}/bot", "base_file_url": f"{TELEGRAM_API_BASE_URL}/file/bot"}
+    bot = DedupingBot(
+        TELEGRAM_BOT_TOKEN,
+        request=InstrumentedRequest(HTTPXRequest(connection_pool_size=UPDATE_CONCURRENCY + 8)),
+        # getUpdates is a long poll that waits for updates, so timing it would only
+        # crowd the slowest-method list; it is left uninstrumented.
+        get_updates_request=HTTPXRequest(),
+        rate_limiter=ChatPacingRateLimiter(TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST, max_retries=TELEGRAM_MAX_RETRIES),
+        **endpoints,
+    )
+    metrics.register_callback(
+        "telegram_edits", "gauge", "Message edits by outcome: sent or skipped as no-ops.",
+        lambda: [({"result": result}, bot.output_stats[result]) for result in ("sent", "skipped")],
+    )
+    builder = (
+        Application.builder()
+        .bot(bot)
+        .concurrent_updates(update_processor)
+        .post_stop(stop_log_followers)
+        .post_shutdown(shutdown_gateway)
+    )
+    if PERSISTENCE_PATH:
+        builder = builder.persistence(StatePersistence(SQLiteStateStore(PERSISTENCE_PATH), PERSISTENCE_INTERVAL))
+    if METRICS_PORT:
+        builder = builder.post_init(start_metrics_server)
+    application = builder.build()
 
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler("start", start)],
@@ -437,38 +3107,119 @@ def main() -> None:
                 CallbackQueryHandler(view_logs_handler, pattern="^view_logs$"),
                 CallbackQueryHandler(manage_envs_handler, pattern="^manage_envs$"),
                 CallbackQueryHandler(list_apps_callback, pattern="^list_apps$"),
+                CallbackQueryHandler(bulk_actions_handler, pattern="^bulk_actions$"),
+            ],
+            SELECTING_APP_FOR_RESTART: app_picker_handlers(dyno_panel_handler),
+            MANAGING_DYNOS: [
+                CallbackQueryHandler(dyno_panel_handler, pattern="^dyno_refresh$"),
+                CallbackQueryHandler(restart_one_dyno, pattern="^dyno_rone_"),
+                CallbackQueryHandler(start_rolling_restart, pattern="^(dyno_rtype_|dyno_rall$)"),
+                CallbackQueryHandler(confirm_restart_all, pattern="^dyno_rnow$"),
+                CallbackQueryHandler(show_scale_options, pattern="^dyno_scale_"),
+                CallbackQueryHandler(back_to_main_menu, pattern="^main_menu$"),
+            ],
+            SCALING_DYNOS: [
+                CallbackQueryHandler(scale_dynos, pattern="^dyno_(qty|size)_"),
+                CallbackQueryHandler(dyno_panel_handler, pattern="^dyno_back$"),
+            ],
+            CONFIRM_DYNO_ACTION: [
+                CallbackQueryHandler(dyno_confirm, pattern="^dyno_confirm$"),
+                CallbackQueryHandler(dyno_panel_handler, pattern="^dyno_back$"),
+            ],
+            SELECTING_APP_FOR_LOGS: app_picker_handlers(show_logs_for_selected_app),
+            SELECTING_APP_FOR_ENV: app_picker_handlers(show_env_options),
+            SEARCHING_APPS: [MessageHandler(filters.TEXT & ~filters.COMMAND, app_search_input)],
+            SELECTING_APPS_FOR_BULK: app_picker_handlers(toggle_bulk_app) + [
+                CallbackQueryHandler(bulk_select_page, pattern="^bulk_select_page$"),
+                CallbackQueryHandler(bulk_clear, pattern="^bulk_clear$"),
+                CallbackQueryHandler(bulk_continue, pattern="^bulk_continue$"),
             ],
-            SELECTING_APP_FOR_RESTART: [CallbackQueryHandler(restart_selected_app, pattern="^app_")],
-            SELECTING_APP_FOR_LOGS: [CallbackQueryHandler(show_logs_for_selected_app, pattern="^app_")],
-            SELECTING_APP_FOR_ENV: [CallbackQueryHandler(show_env_options, pattern="^app_")],
+            SELECTING_BULK_ACTION: [
+                CallbackQueryHandler(bulk_restart, pattern="^bulk_restart$"),
+                CallbackQueryHandler(bulk_set_env_start, pattern="^bulk_set_env$"),
+                CallbackQueryHandler(bulk_back_to_apps, pattern="^bulk_back_to_apps$"),
+            ],
+            ENTERING_BULK_ENV_KEY: [MessageHandler(filters.TEXT & ~filters.COMMAND, bulk_set_env_get_key)],
+            ENTERING_BULK_ENV_VALUE: [MessageHandler(filters.TEXT & ~filters.COMMAND, bulk_set_env_get_value)],
+            CONFIRM_BULK_ACTION: [CallbackQueryHandler(bulk_confirm, pattern="^bulk_confirm$")],
+            SELECTING_LOG_ACTION: [
+                CallbackQueryHandler(log_lines_callback, pattern="^log_lines_"),
+                CallbackQueryHandler(follow_logs, pattern="^follow_logs$"),
+                CallbackQueryHandler(back_to_main_menu, pattern="^main_menu$"),
+            ],
+            FOLLOWING_LOGS: [CallbackQueryHandler(stop_follow_logs, pattern="^stop_follow_logs$")],
             SELECTING_ENV_ACTION: [
                 CallbackQueryHandler(env_page_callback, pattern="^env_page_"),
                 CallbackQueryHandler(start_env_update_flow, pattern="^update_env_"),
                 CallbackQueryHandler(add_env_start, pattern="^add_env$"),
                 CallbackQueryHandler(delete_env_start, pattern="^delete_env$"),
+                CallbackQueryHandler(review_env_changes, pattern="^review_env_changes$"),
+                CallbackQueryHandler(import_env_start, pattern="^import_env$"),
+                CallbackQueryHandler(export_env, pattern="^export_env$"),
                 CallbackQueryHandler(noop_callback, pattern="^noop$"),
                 CallbackQueryHandler(back_to_main_menu, pattern="^main_menu$"),
             ],
-            AWAITING_NEW_VALUE: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_new_value_and_confirm)],
-            CONFIRM_UPDATE: [CallbackQueryHandler(process_env_update_confirmation, pattern="^(confirm|cancel)_update$")],
+            AWAITING_NEW_VALUE: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_new_value_and_stage)],
             ENTERING_ENV_KEY_ADD: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_env_get_key)],
-            ENTERING_ENV_VALUE_ADD: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_env_get_value_and_set)],
-            ENTERING_ENV_KEY_DELETE: [MessageHandler(filters.TEXT & ~filters.COMMAND, delete_env_get_key_and_confirm)],
-            CONFIRM_ENV_DELETE: [CallbackQueryHandler(process_delete_env_confirmation, pattern="^(confirm|cancel)_delete$")],
+            ENTERING_ENV_VALUE_ADD: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_env_get_value_and_stage)],
+            ENTERING_ENV_KEY_DELETE: [MessageHandler(filters.TEXT & ~filters.COMMAND, delete_env_get_key_and_stage)],
+            AWAITING_ENV_FILE: [
+                MessageHandler(filters.Document.ALL, import_env_file),
+                CallbackQueryHandler(back_to_env_options, pattern="^back_to_envs$"),
+            ],
+            REVIEWING_ENV_CHANGES: [
+                CallbackQueryHandler(commit_env_changes, pattern="^commit_env_changes$"),
+                CallbackQueryHandler(discard_env_changes, pattern="^discard_env_changes$"),
+                CallbackQueryHandler(back_to_env_options, pattern="^back_to_envs$"),
+            ],
         },
         fallbacks=[
             CommandHandler("start", start),
             CommandHandler("cancel", cancel),
             CallbackQueryHandler(back_to_main_menu, pattern="^main_menu$"),
+            CallbackQueryHandler(stop_follow_logs, pattern="^stop_follow_logs$"),
         ],
         per_user=True,
+        name="main_conversation",
+        persistent=bool(PERSISTENCE_PATH),
     )
 
     application.add_handler(conv_handler)
-    
+    application.add_handler(CommandHandler("stats", stats_command))
+    instrument_handlers(application.handlers[0])
+    application.job_queue.run_repeating(refresh_app_catalog, interval=APP_CATALOG_TTL / 2, first=1)
+    if WATCH_APPS:
+        application.job_queue.run_repeating(watch_apps, interval=WATCH_INTERVAL, first=5)
+    return application
+
+def main() -> None:
+    if not all([TELEGRAM_BOT_TOKEN, HEROKU_AUTH_TOKEN, BOT_PASSWORD]):
+        logger.critical("FATAL: Missing required environment variables.")
+        return
+
+    if os.environ.get("PORT") and not WEBHOOK_URL:
+        # Heroku sets PORT only on web dynos. Polling there would never bind the
+        # port and would fight the worker over getUpdates.
+        logger.critical("FATAL: PORT is set but WEBHOOK_URL is not. Set WEBHOOK_URL to run as a web dyno, or run the worker.")
+        return
+
+    application = build_application()
     logger.warning("Bot started successfully. Listening for updates...")
     
-    application.run_polling()
+    if WEBHOOK_URL:
+        # The webhook stays registered on shutdown: Telegram queues and retries
+        # updates while the dyno restarts, so nothing is lost between deploys.
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH.lstrip("/"),
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            webhook_url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        application.run_polling()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+import io
+
+import bot
+
+
+def parse(text, filename=".env"):
+    return bot.parse_env_document(io.BytesIO(text.encode("utf-8")), filename)
+
+
+def test_dotenv_values_quotes_and_comments():
+    changes, errors = parse(
+        "# settings\n"
+        "export DEBUG=1\n"
+        "NAME=web app # the display name\n"
+        "URL=https://example.com/#top\n"
+        'GREETING="hello # not a comment" # a comment\n'
+        "RAW='a\\nb'\n"
+        'ESCAPED="line\\none \\"quoted\\""\n'
+        "EMPTY=\n"
+    )
+    assert errors == []
+    assert changes == {
+        "DEBUG": "1",
+        "NAME": "web app",
+        "URL": "https://example.com/#top",
+        "GREETING": "hello # not a comment",
+        "RAW": "a\\nb",
+        "ESCAPED": 'line\none "quoted"',
+        "EMPTY": "",
+    }
+
+
+def test_byte_order_mark_is_accepted():
+    changes, errors = bot.parse_env_document(io.BytesIO("\ufeffKEY=value\n".encode("utf-8")), "vars.env")
+    assert errors == []
+    assert changes == {"KEY": "value"}
+
+
+def test_invalid_lines_are_reported():
+    changes, errors = parse("GOOD=1\nnot a pair\n1BAD=2\n")
+    assert changes == {"GOOD": "1"}
+    assert errors == ["line 2: expected KEY=VALUE", "line 3: invalid key '1BAD'"]
+
+
+def test_json_document():
+    changes, errors = parse('{"A": "x", "B": 2, "C": null, "D": [1]}', "vars.json")
+    assert changes == {"A": "x", "B": "2", "C": None}
+    assert errors == ["key 'D': value must be a string or null"]
+
+
+def test_format_dotenv_round_trip():
+    env_vars = [
+        ("PLAIN", "value"),
+        ("SPACES", "two words"),
+        ("HASH", "a #b"),
+        ("QUOTES", "it's \"quoted\""),
+        ("BACKSLASH", "C:\\path\\n"),
+        ("MULTILINE", "first\nsecond"),
+        ("EMPTY", ""),
+    ]
+    changes, errors = parse(bot.format_dotenv(env_vars))
+    assert errors == []
+    assert changes == dict(env_vars)
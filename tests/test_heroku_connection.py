@@ -0,0 +1,84 @@
+import json
+import shutil
+import ssl
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import bot
+
+
+class RateLimitHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = json.dumps({"remaining": 4000}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("RateLimit-Remaining", "4000")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def tls_api(tmp_path, monkeypatch):
+    if not shutil.which("openssl"):
+        pytest.skip("openssl is needed to create a test certificate")
+    cert, key = tmp_path / "cert.pem", tmp_path / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+         "-keyout", str(key), "-out", str(cert)],
+        check=True, capture_output=True,
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RateLimitHandler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    class TrustingSession(bot.GovernedSession):
+        def __init__(self):
+            super().__init__()
+            self.verify = str(cert)
+
+    monkeypatch.setattr(bot, "GovernedSession", TrustingSession)
+    monkeypatch.setattr(bot, "HEROKU_API_URL", f"https://127.0.0.1:{server.server_port}")
+    yield
+    server.shutdown()
+    server.server_close()
+
+
+def get_within(manager, timeout=10):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("conn", manager.get()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "HerokuConnectionManager.get() did not return"
+    return result["conn"]
+
+
+def test_connect_over_tls_records_handshake(tls_api, monkeypatch):
+    manager = bot.HerokuConnectionManager("key", 2, 300)
+    monkeypatch.setattr(bot, "heroku_connections", manager)
+    conn = get_within(manager)
+    assert conn is get_within(manager)
+    assert manager.stats()["handshakes"] == 1
+
+
+def test_health_check_reconnects_over_tls(tls_api, monkeypatch):
+    manager = bot.HerokuConnectionManager("key", 2, 0)
+    monkeypatch.setattr(bot, "heroku_connections", manager)
+    conn = get_within(manager)
+    # Drop the pooled socket so the health check has to do a new handshake.
+    conn._session.close()
+    assert get_within(manager) is conn
+    stats = manager.stats()
+    assert stats["handshakes"] == 2
+    assert stats["reconnects"] == 0
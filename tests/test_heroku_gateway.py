@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from heroku3.api import RateLimitExceeded
+
+import bot
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    governor = bot.HerokuRateGovernor(4500, 450)
+    monkeypatch.setattr(bot, "heroku_rate_governor", governor)
+    return governor
+
+
+def test_background_calls_wait_for_budget_without_taking_threads(governor):
+    governor.observe(300)
+
+    async def scenario():
+        gateway = bot.HerokuGateway(2, 1, 1)
+        background = [
+            asyncio.ensure_future(gateway.run(lambda: "background", priority=bot.PRIORITY_BACKGROUND))
+            for _ in range(8)
+        ]
+        await asyncio.sleep(0.2)
+        assert await gateway.run(lambda: "interactive") == "interactive"
+        assert not any(task.done() for task in background)
+        assert gateway.stats()["in_flight"] == 0
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        gateway.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_rate_limited_call_is_retried_off_the_worker_thread(governor):
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RateLimitExceeded("slow down")
+        return "done"
+
+    async def scenario():
+        gateway = bot.HerokuGateway(1, 5, 1)
+        task = asyncio.ensure_future(gateway.run(call))
+        await asyncio.sleep(0.5)
+        assert len(attempts) == 1 and not task.done()
+        assert gateway.stats()["in_flight"] == 0
+        assert await task == "done"
+        gateway.shutdown()
+
+    asyncio.run(scenario())
+    assert len(attempts) == 2
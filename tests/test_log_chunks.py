@@ -0,0 +1,13 @@
+import bot
+
+
+def test_long_lines_are_split_instead_of_cut():
+    lines = ["a" * 25, "b", "c c c"]
+    chunks = list(bot.chunk_log_lines(lines, 10))
+    assert all(len(chunk) <= 10 for chunk in chunks)
+    assert "".join(chunks[:3]).startswith("a" * 25)
+    assert "\n".join(chunks).replace("\n", "") == "".join(lines)
+
+
+def test_short_lines_share_a_chunk():
+    assert list(bot.chunk_log_lines(["one", "two", "three"], 20)) == ["one\ntwo\nthree"]
@@ -0,0 +1,17 @@
+import bot
+
+
+def test_render_sorts_families_with_mixed_label_types():
+    registry = bot.MetricsRegistry()
+    registry.inc("heroku_request_errors_total", endpoint="/apps", status=429)
+    registry.inc("heroku_request_errors_total", endpoint="/apps", status="ReadTimeout")
+    registry.inc("heroku_request_errors_total", endpoint="/apps", status=429)
+    registry.observe("telegram_request_seconds", 0.2, method="sendMessage", attempt=1)
+    registry.observe("telegram_request_seconds", 0.1, method="sendMessage", attempt="retry")
+
+    text = registry.render()
+
+    assert 'heroku_request_errors_total{endpoint="/apps",status="429"} 2' in text
+    assert 'heroku_request_errors_total{endpoint="/apps",status="ReadTimeout"} 1' in text
+    assert 'telegram_request_seconds_count{attempt="1",method="sendMessage"} 1' in text
+    assert 'telegram_request_seconds_count{attempt="retry",method="sendMessage"} 1' in text